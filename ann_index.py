@@ -0,0 +1,98 @@
+import math
+import os
+
+import faiss
+import numpy as np
+
+# Corpus sizes (in vectors) at which the search index switches type: Flat -> HNSW -> IVF-PQ
+FLAT_MAX = int(os.getenv("ANN_FLAT_MAX", "10000"))
+HNSW_MAX = int(os.getenv("ANN_HNSW_MAX", "200000"))
+
+# Build and search parameters
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 80
+EF_SEARCH = int(os.getenv("ANN_EF_SEARCH", "64"))
+NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+PQ_BITS = 8
+# Training uses at most this many points per IVF list (faiss recommends 39-256)
+TRAIN_POINTS_PER_LIST = 64
+
+
+# Function to pick the index type for a corpus of n vectors
+def choose_index_kind(n):
+    if n <= FLAT_MAX:
+        return "flat"
+    if n <= HNSW_MAX:
+        return "hnsw"
+    return "ivfpq"
+
+
+# Function to pick the number of PQ sub-quantizers, which must divide the dimension
+def _pq_subquantizers(dimension):
+    for m in (64, 48, 32, 24, 16, 12, 8, 4, 2, 1):
+        if m <= dimension and dimension % m == 0:
+            return m
+    return 1
+
+
+# Function to sample training points for IVF-PQ without copying the whole corpus
+def _training_sample(vectors, size, seed=0):
+    if len(vectors) <= size:
+        return vectors
+    rng = np.random.default_rng(seed)
+    return vectors[np.sort(rng.choice(len(vectors), size, replace=False))]
+
+
+# Function to build an L2 search index over the vectors, choosing the type by corpus size
+# unless `kind` is given. Vectors keep their input order as index positions.
+def build_search_index(vectors, kind=None, nlist=None):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n, dimension = vectors.shape
+    kind = kind or choose_index_kind(n)
+
+    if kind == "flat":
+        index = faiss.IndexFlatL2(dimension)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, HNSW_M)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif kind == "ivfpq":
+        nlist = nlist or max(1, min(int(4 * math.sqrt(n)), n // 39))
+        quantizer = faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_subquantizers(dimension), PQ_BITS)
+        index.train(_training_sample(vectors, nlist * TRAIN_POINTS_PER_LIST))
+    else:
+        raise ValueError(f"Unknown index kind: {kind}")
+
+    index.add(vectors)
+    if kind == "ivfpq":
+        # Keeps reconstruct() working for max-marginal-relevance search
+        index.make_direct_map()
+    tune_index(index)
+    return index
+
+
+# Function to apply the search-time parameters (nprobe / efSearch) to a loaded index.
+# The parameters are set through a downcast view, which does not own the index, so the
+# owning object passed in is what gets returned and must be kept.
+def tune_index(index, nprobe=NPROBE, ef_search=EF_SEARCH):
+    view = faiss.downcast_index(index)
+    if hasattr(view, "nprobe"):
+        view.nprobe = nprobe
+    if hasattr(view, "hnsw"):
+        view.hnsw.efSearch = ef_search
+    return index
+
+
+# Function to describe an index type, e.g. for display or benchmarks
+def index_kind(index):
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+
+# Function to estimate the memory held by an index from its serialized size
+def index_bytes(index):
+    return faiss.serialize_index(index).nbytes
@@ -0,0 +1,109 @@
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# A new question reuses a stored answer when its embedding is at least this similar
+SIMILARITY_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL", "3600"))
+MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_SIZE", "2000"))
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+# Process-wide cache of answers keyed by (namespace, question embedding).
+# Entries expire after a TTL, the least recently used are evicted past MAX_ENTRIES,
+# and all entries of a namespace are dropped once its index version changes.
+class SemanticAnswerCache:
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, ttl=TTL_SECONDS, max_entries=MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._entries = OrderedDict()
+        self._namespaces = {}
+        self.stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+    def _drop(self, entry_id):
+        entry = self._entries.pop(entry_id, None)
+        if entry is not None:
+            namespace = self._namespaces.get(entry["namespace"])
+            if namespace is not None:
+                namespace["ids"].remove(entry_id)
+
+    def _namespace(self, namespace, version):
+        state = self._namespaces.get(namespace)
+        if state is not None and state["version"] != version:
+            # The index was rebuilt; its answers may no longer hold
+            for entry_id in list(state["ids"]):
+                self._drop(entry_id)
+            state = None
+        if state is None:
+            state = self._namespaces[namespace] = {"version": version, "ids": []}
+        return state
+
+    def lookup(self, namespace, version, query_vector):
+        query = _normalize(query_vector)
+        now = time.time()
+        with self._lock:
+            state = self._namespace(namespace, version)
+            for entry_id in [i for i in state["ids"] if now - self._entries[i]["created"] > self.ttl]:
+                self._drop(entry_id)
+
+            if state["ids"]:
+                vectors = np.vstack([self._entries[i]["vector"] for i in state["ids"]])
+                similarities = vectors @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    entry_id = state["ids"][best]
+                    self._entries.move_to_end(entry_id)
+                    entry = self._entries[entry_id]
+                    self.stats["hits"] += 1
+                    self.stats["saved_seconds"] += entry["seconds"]
+                    return dict(entry, similarity=float(similarities[best]))
+
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, namespace, version, query_vector, question, answer, seconds):
+        with self._lock:
+            state = self._namespace(namespace, version)
+            entry_id = next(self._ids)
+            self._entries[entry_id] = {
+                "namespace": namespace,
+                "vector": _normalize(query_vector),
+                "question": question,
+                "answer": answer,
+                "seconds": seconds,
+                "created": time.time(),
+            }
+            state["ids"].append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def snapshot(self):
+        with self._lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, entries=len(self._entries),
+                        hit_rate=self.stats["hits"] / total if total else 0.0)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide answer cache
+def get_answer_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticAnswerCache()
+        return _cache
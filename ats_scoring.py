@@ -0,0 +1,151 @@
+import functools
+import hashlib
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from io import BytesIO
+
+import numpy as np
+
+# Deterministic local resume/JD matching: a BM25-style keyword coverage score, optionally
+# blended with the cosine similarity of local embeddings. Runs in milliseconds, so the
+# model only needs to see the candidates worth a closer look.
+
+# BM25 term saturation and length normalization
+K1 = 1.2
+B = 0.75
+# Keyword tokens in a typical resume; longer resumes need more mentions for full credit
+REFERENCE_LENGTH = 400
+# Share of the final score taken by embedding similarity when embeddings are given
+SEMANTIC_WEIGHT = 0.4
+MISSING_KEYWORDS = 15
+# Characters per piece when embedding long texts (local models truncate long inputs)
+EMBED_PIECE_CHARS = 1000
+# Texts whose token counts are kept, so scoring and word clouds tokenize each text once
+TERM_CACHE_SIZE = 512
+# Rendered word-cloud PNGs kept in memory
+WORDCLOUD_CACHE_ENTRIES = 64
+
+# Keeps tokens like c++, c#, node.js and ci/cd together
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#./-]*[a-z0-9+#]|[a-z0-9]")
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each etc few for from further had has have
+having he her here hers him his how i if in into is it its itself just may me might more most must my no
+nor not of off on once only or other our ours out over own per same she should so some such than that the
+their them then there these they this those through to too under until up upon us very via was we were
+what when where which while who whom why will with within without would you your yours
+ability able across candidate candidates experience experienced ideal ideally including job knowledge looking need needs nice plus
+preferred required requirements responsibilities responsible role skills strong team teams understanding
+seeking using want well work working year years
+""".split())
+
+
+# Function to split text into lowercase keyword tokens, dropping stopwords and bare numbers
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower())
+            if token not in STOPWORDS and not token.replace(".", "").isdigit()]
+
+
+# Function to count the keyword tokens of a text. Counts are cached and shared between
+# callers, so they must not be modified.
+@functools.lru_cache(maxsize=TERM_CACHE_SIZE)
+def term_counts(text):
+    return Counter(tokenize(text))
+
+
+_wordclouds = OrderedDict()
+_wordclouds_lock = threading.Lock()
+
+
+# Function to render the keyword cloud of a text straight to PNG bytes (no matplotlib
+# figure involved), cached by (text hash, size). Returns None when the text has no keywords.
+def wordcloud_png(text, width=800, height=400):
+    key = (hashlib.sha256(text.encode("utf-8")).hexdigest(), width, height)
+    with _wordclouds_lock:
+        png = _wordclouds.get(key)
+        if png is not None:
+            _wordclouds.move_to_end(key)
+            return png
+
+    counts = term_counts(text)
+    if not counts:
+        return None
+    # Imported lazily so scoring alone never loads the layout engine
+    from wordcloud import WordCloud
+
+    image = WordCloud(width=width, height=height, background_color="white").generate_from_frequencies(counts).to_image()
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", optimize=True)
+    png = buffer.getvalue()
+
+    with _wordclouds_lock:
+        _wordclouds[key] = png
+        while len(_wordclouds) > WORDCLOUD_CACHE_ENTRIES:
+            _wordclouds.popitem(last=False)
+    return png
+
+
+# Function to embed texts as the mean of their unit-length piece embeddings
+def _embed_documents(texts, embeddings):
+    pieces = []
+    owners = []
+    for index, text in enumerate(texts):
+        for start in range(0, max(len(text), 1), EMBED_PIECE_CHARS):
+            pieces.append(text[start:start + EMBED_PIECE_CHARS])
+            owners.append(index)
+    vectors = np.asarray(embeddings.embed_documents(pieces), dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    sums = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+    np.add.at(sums, np.asarray(owners), vectors)
+    return sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+
+
+# Function to score resumes against a job description. Every JD keyword is weighted by
+# how often the JD uses it (log-scaled); a resume earns credit for each keyword through
+# BM25 saturation, normalized so one mention in a resume of REFERENCE_LENGTH counts in full.
+# Scores depend only on the resume and the JD, never on the rest of the batch.
+# Returns one dict per resume: score (0-100), lexical, semantic (or None) and missing keywords.
+def score_resumes(resume_texts, job_desc, embeddings=None, missing_limit=MISSING_KEYWORDS):
+    jd_counts = term_counts(job_desc)
+    vocabulary = sorted(jd_counts, key=lambda term: (-jd_counts[term], term))
+    if not resume_texts:
+        return []
+    position = {term: column for column, term in enumerate(vocabulary)}
+
+    # Resume x JD-keyword count matrix
+    counts = np.zeros((len(resume_texts), len(vocabulary)), dtype=np.float32)
+    lengths = np.zeros(len(resume_texts), dtype=np.float32)
+    for row, text in enumerate(resume_texts):
+        resume_counts = term_counts(text)
+        lengths[row] = sum(resume_counts.values())
+        columns = [position[term] for term in resume_counts if term in position]
+        counts[row, columns] = [resume_counts[vocabulary[column]] for column in columns]
+
+    weights = np.array([1 + math.log(jd_counts[term]) for term in vocabulary], dtype=np.float32)
+    if vocabulary:
+        norm = K1 * (1 - B + B * lengths / REFERENCE_LENGTH)
+        # Equals 1 for a single mention at the reference length; capped so stuffing does not pay
+        credit = np.minimum(counts * (K1 + 1) / (counts + norm[:, None]), 1.0)
+        lexical = 100 * (credit @ weights) / weights.sum()
+    else:
+        lexical = np.zeros(len(resume_texts), dtype=np.float32)
+
+    semantic = None
+    scores = lexical
+    if embeddings is not None:
+        vectors = _embed_documents([job_desc] + list(resume_texts), embeddings)
+        semantic = 100 * np.clip(vectors[1:] @ vectors[0], 0.0, 1.0)
+        scores = (1 - SEMANTIC_WEIGHT) * lexical + SEMANTIC_WEIGHT * semantic
+
+    results = []
+    for row in range(len(resume_texts)):
+        missing = [vocabulary[column] for column in np.flatnonzero(counts[row] == 0)[:missing_limit]]
+        results.append({
+            "score": round(float(scores[row]), 1),
+            "lexical": round(float(lexical[row]), 1),
+            "semantic": None if semantic is None else round(float(semantic[row]), 1),
+            "missing": missing,
+        })
+    return results
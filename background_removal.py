@@ -0,0 +1,228 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+
+import numpy as np
+from PIL import Image, ImageColor, ImageEnhance, ImageFilter, ImageOps
+
+from metrics import track
+
+# Segmentation models offered by the background remover, with what each is good for
+MODELS = {
+    "u2net": "General purpose, best quality (176 MB)",
+    "u2netp": "Lightweight and fastest, softer edges (4.7 MB)",
+    "isnet-general-use": "Sharpest edges, slowest (179 MB)",
+    "silueta": "u2net quality in a smaller model (43 MB)",
+}
+DEFAULT_MODEL = os.getenv("REMBG_MODEL", "u2net")
+# Images processed at once in a batch. ONNX Runtime and Pillow release the GIL for the heavy
+# work, so threads share one loaded model and still use every core.
+BATCH_WORKERS = int(os.getenv("REMBG_WORKERS", str(os.cpu_count() or 1)))
+# ONNX Runtime threads per session (0 is the runtime's default, all cores). A single image
+# gets every core; a batch uses its own session per model with the cores split between the
+# workers, so a full batch does not oversubscribe them.
+INTRA_OP_THREADS = int(os.getenv("REMBG_INTRA_OP_THREADS", "0"))
+BATCH_INTRA_OP_THREADS = int(os.getenv(
+    "REMBG_BATCH_INTRA_OP_THREADS", str(max(1, (os.cpu_count() or 1) // BATCH_WORKERS))
+))
+INTER_OP_THREADS = int(os.getenv("REMBG_INTER_OP_THREADS", "0"))
+# Larger uploads are scaled down to this longest side before segmentation
+MAX_SIDE = 2000
+# Memory for cached alpha masks (1 byte per pixel) and for the decoded, resized uploads they
+# belong to (3 bytes per pixel); a 2000px image takes up to 4 MB and 12 MB
+MASK_CACHE_BYTES = int(os.getenv("REMBG_MASK_CACHE_MB", "256")) * 1024 * 1024
+IMAGE_CACHE_BYTES = int(os.getenv("REMBG_IMAGE_CACHE_MB", "512")) * 1024 * 1024
+
+BACKGROUNDS = {"white": (255, 255, 255), "black": (0, 0, 0)}
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+_cache_lock = threading.Lock()
+_masks = OrderedDict()
+_masks_bytes = 0
+_images = OrderedDict()
+_images_bytes = 0
+_mask_stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+
+# Function to build a rembg session with our ONNX Runtime thread settings
+def _create_session(model_name, intra_op_threads, inter_op_threads):
+    import onnxruntime as ort
+    from rembg import new_session
+
+    options = ort.SessionOptions()
+    if intra_op_threads:
+        options.intra_op_num_threads = intra_op_threads
+    if inter_op_threads:
+        options.inter_op_num_threads = inter_op_threads
+    try:
+        from rembg.sessions import sessions_class
+    except ImportError:
+        # Older rembg: no way to pass session options, use its defaults
+        return new_session(model_name)
+    for session_class in sessions_class:
+        if session_class.name() == model_name:
+            return session_class(model_name, options)
+    return new_session(model_name)
+
+
+# Function to get the process-wide rembg session for a model. Loading the ONNX model
+# takes seconds, so each (model, thread settings) is loaded once and then reused.
+def get_session(model_name=DEFAULT_MODEL, intra_op_threads=INTRA_OP_THREADS, inter_op_threads=INTER_OP_THREADS):
+    if model_name not in MODELS:
+        raise ValueError(f"Unknown segmentation model {model_name!r}; choose one of {', '.join(MODELS)}.")
+    key = (model_name, intra_op_threads, inter_op_threads)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _create_session(model_name, intra_op_threads, inter_op_threads)
+        return session
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+# Function to get the process-wide worker pool for batch processing
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="rembg")
+        return _executor
+
+
+def _decode(data, max_side):
+    image = Image.open(BytesIO(data))
+    # Before anything loads the pixels, so JPEGs far larger than needed decode at a reduced
+    # scale; the bounding box is square, so the EXIF rotation after it does not matter
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    return ImageOps.exif_transpose(image).convert("RGB")
+
+
+# Function to decode an upload and scale it down to the max side, ready for segmentation.
+# Kept by content hash, so a rerun with the same uploads skips decoding and resizing.
+def load_image(data, max_side=MAX_SIDE):
+    global _images_bytes
+    key = (hashlib.sha256(data).hexdigest(), max_side)
+    with _cache_lock:
+        image = _images.get(key)
+        if image is not None:
+            _images.move_to_end(key)
+            return image
+
+    image = _decode(data, max_side)
+    with _cache_lock:
+        if key not in _images:
+            _images[key] = image
+            _images_bytes += image.width * image.height * 3
+        while _images_bytes > IMAGE_CACHE_BYTES and len(_images) > 1:
+            _, evicted = _images.popitem(last=False)
+            _images_bytes -= evicted.width * evicted.height * 3
+    return image
+
+
+# Function to apply the brightness, contrast, sharpness and blur settings
+def enhance_image(image, settings):
+    for enhancer, name in ((ImageEnhance.Brightness, "brightness"), (ImageEnhance.Contrast, "contrast"),
+                           (ImageEnhance.Sharpness, "sharpness")):
+        if settings.get(name, 1.0) != 1.0:
+            image = enhancer(image).enhance(settings[name])
+    if settings.get("blur", 0):
+        image = image.filter(ImageFilter.GaussianBlur(settings["blur"]))
+    return image
+
+
+# Function to get the alpha mask (uint8 array) of an image. Masks are cached by the hash
+# of the segmented pixels and the model, so only a new image or model runs the network.
+# Returns (mask, cached).
+def get_mask(image, model_name=DEFAULT_MODEL, use_cache=True, intra_op_threads=INTRA_OP_THREADS):
+    global _masks_bytes
+    key = (hashlib.sha256(image.tobytes()).hexdigest(), image.size, model_name)
+    with _cache_lock:
+        cached = _masks.get(key) if use_cache else None
+        if cached is not None:
+            _masks.move_to_end(key)
+            _mask_stats["hits"] += 1
+            _mask_stats["saved_seconds"] += cached["seconds"]
+            return cached["mask"], True
+
+    started = time.perf_counter()
+    with track("background_remover", "remove", image.width * image.height):
+        from rembg import remove
+
+        mask = remove(image, session=get_session(model_name, intra_op_threads), only_mask=True)
+    mask = np.asarray(mask.convert("L"))
+    with _cache_lock:
+        _mask_stats["misses"] += 1
+        if key not in _masks:
+            _masks[key] = {"mask": mask, "seconds": time.perf_counter() - started}
+            _masks_bytes += mask.nbytes
+        while _masks_bytes > MASK_CACHE_BYTES and len(_masks) > 1:
+            _, evicted = _masks.popitem(last=False)
+            _masks_bytes -= evicted["mask"].nbytes
+    return mask, False
+
+
+# Function to report the mask cache statistics
+def mask_cache_snapshot():
+    with _cache_lock:
+        total = _mask_stats["hits"] + _mask_stats["misses"]
+        return dict(_mask_stats, entries=len(_masks), bytes=_masks_bytes + _images_bytes,
+                    hit_rate=_mask_stats["hits"] / total if total else 0.0)
+
+
+# Function to put an image on a background through its alpha mask. `bg_color` is
+# "transparent", "white", "black" or any color Pillow understands, such as "#ff8800".
+def composite(image, mask, bg_color="transparent"):
+    rgb = np.asarray(image if image.mode == "RGB" else image.convert("RGB"))
+    if bg_color == "transparent":
+        # Clear the color under fully transparent pixels, as rembg's cut-out does
+        rgb = np.where(mask[..., None] > 0, rgb, 0).astype(np.uint8)
+        return Image.fromarray(np.dstack([rgb, mask]), "RGBA")
+    background = np.array(BACKGROUNDS.get(bg_color) or ImageColor.getrgb(bg_color)[:3], dtype=np.uint16)
+    alpha = mask[..., None].astype(np.uint16)
+    blended = (rgb * alpha + background * (255 - alpha) + 127) // 255
+    return Image.fromarray(blended.astype(np.uint8), "RGB")
+
+
+# Function to run the whole pipeline for one uploaded image: decode, segment, enhance
+# and composite. The mask comes from the image before enhancement, so only a new upload,
+# size or model needs a model pass.
+def process_image(data, settings):
+    started = time.perf_counter()
+    image = load_image(data, settings.get("max_side", MAX_SIDE))
+    mask, cached = get_mask(image, settings.get("model", DEFAULT_MODEL), use_cache=settings.get("use_cache", True),
+                            intra_op_threads=settings.get("intra_op_threads", INTRA_OP_THREADS))
+    image = enhance_image(image, settings)
+    return {
+        "original": image,
+        "result": composite(image, mask, settings.get("bg_color", "transparent")),
+        "cached": cached,
+        "seconds": time.perf_counter() - started,
+    }
+
+
+# Function to process many images across the worker pool, yielding
+# (index, result, error) as each one finishes so the caller can show it straight away.
+# More than one image runs on the batch session, which shares the cores between workers.
+def iter_processed(images, settings):
+    if len(images) > 1:
+        settings = dict(settings, intra_op_threads=BATCH_INTRA_OP_THREADS)
+    executor = _get_executor()
+    futures = {executor.submit(process_image, data, settings): index for index, data in enumerate(images)}
+    try:
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result(), None
+            except Exception as error:
+                yield futures[future], None, f"{type(error).__name__}: {error}"
+    finally:
+        for future in futures:
+            future.cancel()
@@ -0,0 +1,117 @@
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+import faiss
+import numpy as np
+
+from ann_index import build_search_index, index_bytes, tune_index
+from vector_store import DOCSTORE_FILE, get_embedding_cache, read_index_meta
+
+# Benchmark of the chat_with_pdf search index types against exact (flat) search.
+# Reports recall@k, single-query p50/p99 latency and index memory per configuration:
+#   python bench_ann.py --vectors 200000 --dim 768
+#   python bench_ann.py --index-dir faiss_index/<namespace>
+
+
+# Function to generate clustered synthetic vectors, closer to real embeddings than uniform noise
+def synthetic_vectors(n, dimension, clusters=256, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + 0.3 * rng.normal(size=(n, dimension)).astype(np.float32)
+    return vectors.astype(np.float32)
+
+
+# Function to load the vectors of a saved namespace from the embedding cache
+def namespace_vectors(index_dir):
+    meta = read_index_meta(index_dir)
+    if meta is None:
+        raise SystemExit(f"{index_dir} has no meta.json; rebuild it first.")
+    conn = sqlite3.connect(os.path.join(index_dir, DOCSTORE_FILE))
+    doc_ids = [row[0] for row in conn.execute("SELECT doc_id FROM documents ORDER BY position")]
+    conn.close()
+    cached = get_embedding_cache().get_many(meta["embedding_model"], doc_ids)
+    return np.vstack([cached[doc_id] for doc_id in doc_ids if doc_id in cached])
+
+
+# Function to time single queries and collect the result ids
+def run_queries(index, queries, k):
+    threads = faiss.omp_get_max_threads()
+    # Single-threaded search, as each Streamlit question is one query
+    faiss.omp_set_num_threads(1)
+    latencies = []
+    results = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        results[i] = ids[0]
+    faiss.omp_set_num_threads(threads)
+    return results, np.array(latencies)
+
+
+# Function to compute mean recall@k of approximate results against exact ones
+def recall_at_k(approx, exact):
+    hits = [len(set(a) & set(e)) for a, e in zip(approx, exact)]
+    return float(np.mean(hits)) / exact.shape[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall/latency benchmark for FAISS index types.")
+    parser.add_argument("--index-dir", help="Benchmark the vectors of a saved namespace instead of synthetic data")
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    args = parser.parse_args()
+
+    vectors = namespace_vectors(args.index_dir) if args.index_dir else synthetic_vectors(args.vectors, args.dim)
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(vectors), min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.05 * rng.normal(size=(len(picks), vectors.shape[1])).astype(np.float32)
+    k = min(args.k, len(vectors))
+
+    configurations = [("flat", {}, None)]
+    configurations += [("hnsw", {"ef_search": ef}, "efSearch") for ef in args.ef_search]
+    configurations += [("ivfpq", {"nprobe": nprobe}, "nprobe") for nprobe in args.nprobe]
+
+    exact = None
+    built = {}
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={k}")
+    for kind, params, label in configurations:
+        if kind not in built:
+            started = time.perf_counter()
+            built[kind] = (build_search_index(vectors, kind=kind), time.perf_counter() - started)
+        index, build_seconds = built[kind]
+        tune_index(index, **params)
+
+        ids, latencies = run_queries(index, queries, k)
+        if exact is None:
+            exact = ids
+        row = {
+            "index": kind,
+            "param": f"{label}={next(iter(params.values()))}" if params else "-",
+            "recall": recall_at_k(ids, exact),
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "memory_mb": index_bytes(index) / (1024 * 1024),
+            "build_s": build_seconds,
+        }
+        if args.json:
+            print(json.dumps(row))
+        else:
+            print(
+                f"{row['index']:<6} {row['param']:<12} recall@{k}={row['recall']:.3f} "
+                f"p50={row['p50_ms']:.3f}ms p99={row['p99_ms']:.3f}ms "
+                f"mem={row['memory_mb']:.1f}MB build={row['build_s']:.1f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import argparse
+import os
+import time
+
+from image_prep import IMAGE_FORMAT, PROFILES, prepare_image
+
+# Benchmark of image preprocessing before multimodal upload. For every image it reports the
+# upload size before and after, the preprocessing time and the transfer time at a given uplink;
+# with --live it also times real model calls (e.g. against GEMINI_API_ENDPOINT):
+#   python bench_images.py --dir assets --uplink-mbps 10
+#   GEMINI_API_ENDPOINT=http://localhost:8765 python bench_images.py --live
+
+MIME_TYPES = {"jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png", "webp": "image/webp"}
+
+
+# Function to time one uncached model call with an image part
+def time_call(part):
+    from gemini_client import generate_text
+
+    started = time.perf_counter()
+    generate_text("gemini-1.5-flash", ["Describe this image in one sentence.", part], use_cache=False, page="bench")
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark image downscaling and re-encoding.")
+    parser.add_argument("--dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets"))
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--uplink-mbps", type=float, default=10.0, help="Uplink used to estimate transfer time")
+    parser.add_argument("--live", action="store_true", help="Also time model calls with both versions")
+    args = parser.parse_args()
+
+    files = sorted(name for name in os.listdir(args.dir) if name.rsplit(".", 1)[-1].lower() in MIME_TYPES)
+    bytes_per_sec = args.uplink_mbps * 1e6 / 8
+    print(f"Output format: {IMAGE_FORMAT} · uplink {args.uplink_mbps:g} Mbit/s")
+    for profile in args.profiles.split(","):
+        print(f"\n[{profile}] max side {PROFILES[profile]['max_side']}px")
+        header = f"{'image':<22} {'original':>10} {'prepared':>10} {'ratio':>6} {'prep ms':>8} {'upload ms':>16}"
+        print(header + (f" {'call ms':>18}" if args.live else ""))
+        total_before = total_after = 0
+        for name in files:
+            with open(os.path.join(args.dir, name), "rb") as f:
+                data = f.read()
+            mime_type = MIME_TYPES[name.rsplit(".", 1)[-1].lower()]
+            started = time.perf_counter()
+            # Each (image, profile) is prepared once, so this is never served from the cache
+            part, stats = prepare_image(data, mime_type, profile)
+            prep_ms = (time.perf_counter() - started) * 1000
+            total_before += len(data)
+            total_after += stats["bytes"]
+            line = (f"{name:<22} {len(data) / 1024:>8.0f}KB {stats['bytes'] / 1024:>8.0f}KB "
+                    f"{len(data) / stats['bytes']:>5.1f}x {prep_ms:>8.1f} "
+                    f"{len(data) / bytes_per_sec * 1000:>7.0f} -> {stats['bytes'] / bytes_per_sec * 1000:>5.0f}")
+            if args.live:
+                before = time_call({"mime_type": mime_type, "data": data})
+                after = time_call(part)
+                line += f" {before * 1000:>8.0f} -> {after * 1000:>6.0f}"
+            print(line)
+        print(f"{'total':<22} {total_before / 1024:>8.0f}KB {total_after / 1024:>8.0f}KB "
+              f"{total_before / max(total_after, 1):>5.1f}x")
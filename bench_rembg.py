@@ -0,0 +1,82 @@
+import argparse
+import os
+import resource
+import time
+
+from PIL import Image
+
+from background_removal import (
+    BATCH_INTRA_OP_THREADS, BATCH_WORKERS, INTER_OP_THREADS, INTRA_OP_THREADS, MODELS, get_session, iter_processed,
+)
+
+# Benchmark of the background remover's segmentation models. For each model it reports
+# the session load time, the resident memory it adds and the per-image latency on assets/:
+#   python bench_rembg.py
+#   python bench_rembg.py --models u2netp,silueta --intra-op-threads 2 --repeat 5
+# With --batch N it also times the parallel batch pipeline on N images; compare pool sizes with
+#   REMBG_WORKERS=1 python bench_rembg.py --models u2netp --batch 50
+#   REMBG_WORKERS=8 python bench_rembg.py --models u2netp --batch 50
+
+
+# Function to read the resident memory of this process in MB
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except OSError:
+        # Peak rather than current, but the best available off Linux (KB on Linux, bytes on macOS)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark rembg segmentation models.")
+    parser.add_argument("--dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets"))
+    parser.add_argument("--models", default=",".join(MODELS))
+    parser.add_argument("--repeat", type=int, default=3, help="Timed passes over the images after one warm-up")
+    parser.add_argument("--intra-op-threads", type=int, default=INTRA_OP_THREADS)
+    parser.add_argument("--inter-op-threads", type=int, default=INTER_OP_THREADS)
+    parser.add_argument("--batch", type=int, default=0, help="Also time the batch pipeline on this many images")
+    args = parser.parse_args()
+
+    names = sorted(name for name in os.listdir(args.dir) if name.lower().endswith((".jpg", ".jpeg", ".png")))
+    images = [Image.open(os.path.join(args.dir, name)).convert("RGB") for name in names]
+    uploads = []
+    for name in names:
+        with open(os.path.join(args.dir, name), "rb") as f:
+            uploads.append(f.read())
+    print(f"{len(images)} images from {args.dir} · intra-op threads {args.intra_op_threads or 'default'}, "
+          f"inter-op threads {args.inter_op_threads or 'default'}")
+    print(f"{'model':<20} {'load s':>7} {'+RSS MB':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'img/s':>7}")
+
+    for model_name in args.models.split(","):
+        before = rss_mb()
+        started = time.perf_counter()
+        session = get_session(model_name, args.intra_op_threads, args.inter_op_threads)
+        load_seconds = time.perf_counter() - started
+
+        from rembg import remove
+
+        remove(images[0], session=session)  # warm-up
+        latencies = []
+        for _ in range(args.repeat):
+            for image in images:
+                started = time.perf_counter()
+                remove(image, session=session)
+                latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        print(f"{model_name:<20} {load_seconds:>7.2f} {rss_mb() - before:>8.0f} "
+              f"{_percentile(latencies, 0.50) * 1000:>8.0f} {_percentile(latencies, 0.95) * 1000:>8.0f} "
+              f"{latencies[-1] * 1000:>8.0f} {len(latencies) / sum(latencies):>7.2f}")
+
+        if args.batch:
+            batch = [uploads[i % len(uploads)] for i in range(args.batch)]
+            started = time.perf_counter()
+            failed = sum(1 for _, _, error in iter_processed(batch, {"model": model_name, "use_cache": False}) if error)
+            seconds = time.perf_counter() - started
+            print(f"{'':<20} batch of {args.batch} on {BATCH_WORKERS} workers × {BATCH_INTRA_OP_THREADS} threads: "
+                  f"{seconds:.1f}s, "
+                  f"{args.batch / seconds:.2f} img/s" + (f", {failed} failed" if failed else ""))
@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import os
+import time
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+from gemini_client import backoff_delay, client_kwargs, is_retryable
+
+# Batching and concurrency window for embedding calls, tunable per deployment
+BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))
+
+# Selectable embedding backends and the model each one uses
+LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_BACKENDS = {
+    "gemini": "models/embedding-001",
+    "local": LOCAL_EMBEDDING_MODEL,
+}
+DEFAULT_BACKEND = os.getenv("EMBEDDING_BACKEND", "gemini")
+LOCAL_BATCH_SIZE = 64
+
+
+# Function to build the Gemini embeddings client, honouring GEMINI_API_ENDPOINT
+def get_embeddings(model):
+    return GoogleGenerativeAIEmbeddings(model=model, **client_kwargs())
+
+
+# Local CPU embeddings through sentence-transformers, L2-normalized in one vectorized step
+class LocalEmbeddings(Embeddings):
+    def __init__(self, model_name=LOCAL_EMBEDDING_MODEL, batch_size=LOCAL_BATCH_SIZE):
+        # Imported lazily so the Gemini backend never pays for loading torch
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device="cpu")
+
+    def _encode(self, texts):
+        vectors = self.model.encode(
+            texts, batch_size=self.batch_size, convert_to_numpy=True, show_progress_bar=False
+        ).astype(np.float32, copy=False)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def embed_documents(self, texts):
+        return self._encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+
+# Function to build the embeddings object for a backend name ("gemini" or "local")
+def load_backend(backend):
+    model = EMBEDDING_BACKENDS[backend]
+    if backend == "local":
+        return LocalEmbeddings(model)
+    return get_embeddings(model)
+
+
+async def _embed_with_retry(embed_batch, texts, stats, max_retries):
+    for attempt in range(max_retries + 1):
+        try:
+            return await embed_batch(texts)
+        except Exception as error:
+            if attempt == max_retries or not is_retryable(error):
+                raise
+            stats["retries"] += 1
+            await asyncio.sleep(backoff_delay(attempt))
+
+
+# Function to embed texts in fixed-size batches with at most `concurrency` batches in flight.
+# `embed_batch` is an async callable taking a list of texts and returning their vectors.
+async def aembed_texts(texts, embed_batch, batch_size=BATCH_SIZE, concurrency=CONCURRENCY,
+                       max_retries=MAX_RETRIES, on_progress=None):
+    texts = list(texts)
+    vectors = [None] * len(texts)
+    batches = [(start, texts[start:start + batch_size]) for start in range(0, len(texts), batch_size)]
+    stats = {"chunks": len(texts), "batches": len(batches), "retries": 0}
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+    started = time.perf_counter()
+
+    async def run(start, batch):
+        nonlocal done
+        async with semaphore:
+            result = await _embed_with_retry(embed_batch, batch, stats, max_retries)
+        if len(result) != len(batch):
+            raise ValueError(f"Expected {len(batch)} embeddings, got {len(result)}")
+        vectors[start:start + len(batch)] = result
+        done += len(batch)
+        if on_progress:
+            on_progress(done, len(texts))
+
+    await asyncio.gather(*(run(start, batch) for start, batch in batches))
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["chunks_per_sec"] = len(texts) / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    return vectors, stats
+
+
+# Function to embed texts with a langchain embeddings object through the batched pipeline
+def embed_texts(texts, embeddings, batch_size=BATCH_SIZE, concurrency=CONCURRENCY, on_progress=None):
+    if isinstance(embeddings, LocalEmbeddings):
+        # Local encoding is CPU bound; larger batches beat concurrent threads
+        batch_size, concurrency = max(batch_size, embeddings.batch_size * 4), 1
+
+    async def embed_batch(batch):
+        return await asyncio.to_thread(embeddings.embed_documents, batch)
+
+    return asyncio.run(aembed_texts(texts, embed_batch, batch_size, concurrency, on_progress=on_progress))
+
+
+# Command-line throughput check, meant to run against a local fake embedding server:
+#   GEMINI_API_ENDPOINT=http://localhost:8765 python embedding_pipeline.py --chunks 2000 --concurrency 8
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure embedding throughput.")
+    parser.add_argument("--model", default="models/embedding-001")
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--chunk-chars", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    args = parser.parse_args()
+
+    sample = [f"chunk {i} " + "lorem ipsum " * (args.chunk_chars // 12) for i in range(args.chunks)]
+    _, result = embed_texts(sample, get_embeddings(args.model), args.batch_size, args.concurrency)
+    print(
+        f"{result['chunks']} chunks in {result['batches']} batches, {result['retries']} retries: "
+        f"{result['seconds']:.2f}s, {result['chunks_per_sec']:.1f} chunks/sec"
+    )
@@ -0,0 +1,247 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the Gemini REST API, enough for every page of the suite:
+# generateContent, streamGenerateContent, embedContent, batchEmbedContents and countTokens.
+# Point the suite at it with GEMINI_API_ENDPOINT=http://localhost:8765.
+#   python fake_gemini_server.py --port 8765 --ttft-ms 300 --tokens-per-sec 80 --error-rate 0.02
+
+ROUTE = re.compile(r"^/v1(?:beta)?/(?:models|tunedModels)/([^:/]+)(?::(\w+))?$")
+WORDS = ("the model summarizes key points about revenue growth customers risks python sql "
+         "cloud calories protein invoice total vendor date tax item video notes").split()
+
+
+@dataclass
+class FakeConfig:
+    ttft_ms: float = 300.0           # median time to first token
+    latency_sigma: float = 0.5       # log-normal spread of that latency
+    tokens_per_sec: float = 80.0     # streaming token rate after the first token
+    output_tokens: int = 200         # tokens per generated answer
+    chunk_tokens: int = 8            # tokens per streamed chunk
+    embed_ms: float = 40.0           # latency of one embedding request
+    dimension: int = 768
+    error_rate: float = 0.0          # fraction of requests failing
+    error_code: int = 429
+    fail_first: int = 0              # the first N requests fail, whatever the error rate
+
+
+def _estimate_tokens(text):
+    return max(1, math.ceil(len(text) / 4))
+
+
+def _prompt_text(body):
+    texts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            if "text" in part:
+                texts.append(part["text"])
+    return "\n".join(texts)
+
+
+def _image_bytes(body):
+    size = 0
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            data = part.get("inlineData") or part.get("inline_data")
+            if data:
+                size += len(data.get("data", "")) * 3 // 4
+    return size
+
+
+# Function to make a deterministic answer that looks like what each page expects
+def _answer(prompt, config):
+    rng = random.Random(hashlib.sha256(prompt.encode("utf-8")).digest())
+    if "JD Match" in prompt:
+        return json.dumps({
+            "JD Match": f"{rng.randint(30, 95)}%",
+            "MissingKeywords": rng.sample(["Python", "SQL", "AWS", "Docker", "Kubernetes", "Spark"], 3),
+            "Profile Summary": " ".join(rng.choice(WORDS) for _ in range(40)),
+        })
+    if "invoice" in prompt.lower() and "json" in prompt.lower():
+        return json.dumps({
+            "vendor": "Acme Supplies", "invoice_number": f"INV-{rng.randint(1000, 9999)}",
+            "date": "2024-03-15", "currency": "USD", "subtotal": 100.0, "tax": 8.0, "total": 108.0,
+            "line_items": [{"description": "Widget", "quantity": 2, "unit_price": 50.0, "amount": 100.0}],
+        })
+    return " ".join(rng.choice(WORDS) for _ in range(config.output_tokens))
+
+
+# Function to make a deterministic unit-length embedding from the text
+def _embedding(text, dimension):
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    values = [rng.gauss(0, 1) for _ in range(dimension)]
+    norm = math.sqrt(sum(v * v for v in values)) or 1.0
+    return [v / norm for v in values]
+
+
+def _usage(prompt_tokens, output_tokens):
+    return {"promptTokenCount": prompt_tokens, "candidatesTokenCount": output_tokens,
+            "totalTokenCount": prompt_tokens + output_tokens}
+
+
+def _candidate(text, finished):
+    candidate = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    return candidate
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config = FakeConfig()
+    # Requests received by this server, shared by its handler threads
+    stats = {"requests": 0}
+    stats_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status):
+        names = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE"}
+        self._send_json(status, {"error": {"code": status, "message": "Injected fake error",
+                                           "status": names.get(status, "UNKNOWN")}})
+
+    def _sleep_latency(self, median_ms):
+        time.sleep(median_ms / 1000 * random.lognormvariate(0, self.config.latency_sigma))
+
+    def do_GET(self):
+        match = ROUTE.match(urlparse(self.path).path)
+        if not match:
+            return self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+        self._send_json(200, {"name": f"models/{match.group(1)}", "inputTokenLimit": 1048576,
+                              "outputTokenLimit": 8192,
+                              "supportedGenerationMethods": ["generateContent", "embedContent"]})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        match = ROUTE.match(url.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not match:
+            return self._send_json(404, {"error": {"code": 404, "message": "Not found"}})
+        method = match.group(2)
+
+        with self.stats_lock:
+            self.stats["requests"] += 1
+            failing = self.stats["requests"] <= self.config.fail_first
+        if failing or random.random() < self.config.error_rate:
+            self._sleep_latency(self.config.embed_ms)
+            return self._send_error(self.config.error_code)
+
+        if method == "generateContent":
+            return self._generate(body)
+        if method == "streamGenerateContent":
+            return self._stream(body, "sse" in parse_qs(url.query).get("alt", [""])[0])
+        if method == "embedContent":
+            self._sleep_latency(self.config.embed_ms)
+            return self._send_json(200, {"embedding": {"values": _embedding(_prompt_text({"contents": [body.get("content", {})]}), self.config.dimension)}})
+        if method == "batchEmbedContents":
+            self._sleep_latency(self.config.embed_ms)
+            embeddings = [{"values": _embedding(_prompt_text({"contents": [request.get("content", {})]}), self.config.dimension)}
+                          for request in body.get("requests", [])]
+            return self._send_json(200, {"embeddings": embeddings})
+        if method == "countTokens":
+            return self._send_json(200, {"totalTokens": _estimate_tokens(_prompt_text(body)) + _image_bytes(body) // 750})
+        self._send_json(404, {"error": {"code": 404, "message": f"Unsupported method {method}"}})
+
+    def _generate(self, body):
+        prompt = _prompt_text(body)
+        answer = _answer(prompt, self.config)
+        output_tokens = _estimate_tokens(answer)
+        self._sleep_latency(self.config.ttft_ms)
+        time.sleep(output_tokens / self.config.tokens_per_sec)
+        prompt_tokens = _estimate_tokens(prompt) + _image_bytes(body) // 750
+        self._send_json(200, {"candidates": [_candidate(answer, True)],
+                              "usageMetadata": _usage(prompt_tokens, output_tokens)})
+
+    def _stream(self, body, sse):
+        prompt = _prompt_text(body)
+        answer = _answer(prompt, self.config)
+        prompt_tokens = _estimate_tokens(prompt) + _image_bytes(body) // 750
+        step = self.config.chunk_tokens * 4
+        pieces = [answer[i:i + step] for i in range(0, len(answer), step)] or [""]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if sse else "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write(data):
+            encoded = data.encode("utf-8")
+            self.wfile.write(f"{len(encoded):X}\r\n".encode("ascii") + encoded + b"\r\n")
+            self.wfile.flush()
+
+        self._sleep_latency(self.config.ttft_ms)
+        if not sse:
+            write("[")
+        for index, piece in enumerate(pieces):
+            if index:
+                time.sleep(self.config.chunk_tokens / self.config.tokens_per_sec)
+            finished = index == len(pieces) - 1
+            payload = {"candidates": [_candidate(piece, finished)]}
+            if finished:
+                payload["usageMetadata"] = _usage(prompt_tokens, _estimate_tokens(answer))
+            data = json.dumps(payload)
+            write(f"data: {data}\r\n\r\n" if sse else (("," if index else "") + data))
+        if not sse:
+            write("]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+# Function to make a handler class with its own config and request counter
+def handler_class(config=None):
+    return type("ConfiguredHandler", (FakeGeminiHandler,),
+                {"config": config or FakeConfig(), "stats": {"requests": 0}, "stats_lock": threading.Lock()})
+
+
+# Function to start the fake server in a background thread; returns (server, base_url).
+# The handler's config and stats are at server.RequestHandlerClass.
+def start_server(config=None, host="127.0.0.1", port=0):
+    server = ThreadingHTTPServer((host, port), handler_class(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Gemini API server for offline load tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--ttft-ms", type=float, default=FakeConfig.ttft_ms)
+    parser.add_argument("--latency-sigma", type=float, default=FakeConfig.latency_sigma)
+    parser.add_argument("--tokens-per-sec", type=float, default=FakeConfig.tokens_per_sec)
+    parser.add_argument("--output-tokens", type=int, default=FakeConfig.output_tokens)
+    parser.add_argument("--embed-ms", type=float, default=FakeConfig.embed_ms)
+    parser.add_argument("--dimension", type=int, default=FakeConfig.dimension)
+    parser.add_argument("--error-rate", type=float, default=FakeConfig.error_rate)
+    parser.add_argument("--error-code", type=int, default=FakeConfig.error_code, choices=[429, 500, 503])
+    parser.add_argument("--fail-first", type=int, default=FakeConfig.fail_first)
+    args = parser.parse_args()
+
+    config = FakeConfig(
+        ttft_ms=args.ttft_ms, latency_sigma=args.latency_sigma, tokens_per_sec=args.tokens_per_sec,
+        output_tokens=args.output_tokens, embed_ms=args.embed_ms, dimension=args.dimension,
+        error_rate=args.error_rate, error_code=args.error_code, fail_first=args.fail_first,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), handler_class(config))
+    server.daemon_threads = True
+    print(f"Fake Gemini API listening on http://{args.host}:{args.port}")
+    server.serve_forever()
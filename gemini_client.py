@@ -0,0 +1,396 @@
+import json
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import google.generativeai as genai
+from dotenv import load_dotenv
+from google.api_core import exceptions as api_exceptions
+
+from metrics import record, track
+from response_cache import get_response_cache, request_key
+
+# Load environment variables
+load_dotenv()
+
+API_KEY = os.getenv("GOOGLE_API_KEY")
+# Point every Gemini client at another endpoint, e.g. a local fake server:
+#   GEMINI_API_ENDPOINT=http://localhost:8765
+API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+# Process-wide limits shared by every page: concurrent requests and requests per minute
+# (GEMINI_RPM=0 turns the per-minute limit off)
+MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "8"))
+REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_RPM", "60"))
+BURST = int(os.getenv("GEMINI_BURST", "5"))
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 32.0
+
+RETRYABLE_ERRORS = (
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.InternalServerError,
+    api_exceptions.DeadlineExceeded,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+# Function to get the extra client arguments needed for a custom endpoint
+def client_kwargs():
+    if API_ENDPOINT:
+        return {"client_options": {"api_endpoint": API_ENDPOINT}, "transport": "rest"}
+    return {}
+
+
+_configured = False
+_models = {}
+_models_lock = threading.Lock()
+
+
+# Function to configure the Gemini SDK for this process (only the first call does anything)
+def configure():
+    global _configured
+    with _models_lock:
+        if not _configured:
+            genai.configure(api_key=API_KEY, **client_kwargs())
+            _configured = True
+
+
+# Function to get the shared model object for a model name
+def get_model(model_name):
+    configure()
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is None:
+            model = _models[model_name] = genai.GenerativeModel(model_name)
+        return model
+
+
+# Function to decide whether a failed request is worth retrying
+def is_retryable(error):
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    message = str(error)
+    return "429" in message or "503" in message or "quota" in message.lower()
+
+
+# Function to compute a full-jitter exponential backoff delay
+def backoff_delay(attempt):
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+# First-come-first-served admission for model requests: at most `max_in_flight` run at
+# once and starts are paced by a token bucket refilled at `rate_per_minute`. A rate of
+# zero or less leaves starts unpaced.
+class RequestGate:
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, rate_per_minute=REQUESTS_PER_MINUTE, burst=BURST):
+        self.max_in_flight = max_in_flight
+        self.rate = rate_per_minute / 60.0 if rate_per_minute > 0 else None
+        self.burst = burst
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._in_flight = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate)
+        self._refilled = now
+
+    @contextmanager
+    def slot(self):
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    timeout = None
+                    if self._queue[0] is ticket and self._in_flight < self.max_in_flight:
+                        if self.rate is None:
+                            break
+                        self._refill()
+                        if self._tokens >= 1:
+                            break
+                        timeout = (1 - self._tokens) / self.rate
+                    self._cond.wait(timeout)
+            except BaseException:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+                raise
+            self._queue.popleft()
+            if self.rate is not None:
+                self._tokens -= 1
+            self._in_flight += 1
+            self._cond.notify_all()
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def snapshot(self):
+        with self._cond:
+            return {"in_flight": self._in_flight, "queued": len(self._queue)}
+
+
+gate = RequestGate()
+
+
+# Function to run a streaming request under the shared limits. `start_stream` opens the
+# stream; quota and transient errors before the first chunk wait and retry in the queue.
+def limited_stream(start_stream):
+    for attempt in range(MAX_RETRIES + 1):
+        started = False
+        try:
+            with gate.slot():
+                for item in start_stream():
+                    started = True
+                    yield item
+            return
+        except Exception as error:
+            if started or attempt == MAX_RETRIES or not is_retryable(error):
+                raise
+        time.sleep(backoff_delay(attempt))
+
+
+# Function to measure the bytes sent with a request (prompt text plus attachments)
+def payload_size(contents):
+    if isinstance(contents, (list, tuple)):
+        return sum(payload_size(part) for part in contents)
+    if isinstance(contents, dict):
+        return len(contents.get("data", b""))
+    if isinstance(contents, str):
+        return len(contents.encode("utf-8"))
+    if isinstance(contents, (bytes, bytearray)):
+        return len(contents)
+    return 0
+
+
+# Function to copy token counts from a response's usage_metadata into a metrics span
+def record_usage(span, usage_metadata):
+    if usage_metadata is not None:
+        span["input_tokens"] = getattr(usage_metadata, "prompt_token_count", None)
+        span["output_tokens"] = getattr(usage_metadata, "candidates_token_count", None)
+
+
+# Function to turn a streamed generate_content response into text chunks for st.write_stream.
+# Token usage reported on the chunks is copied into `span` when given.
+def stream_text(response, span=None):
+    for chunk in response:
+        if span is not None:
+            record_usage(span, getattr(chunk, "usage_metadata", None))
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. a final safety/usage chunk)
+            continue
+        if text:
+            yield text
+
+
+# Incremental parser that picks the first complete JSON object out of streamed text
+class StreamingJSONParser:
+    def __init__(self):
+        self.parts = []
+        self.object_text = None
+        self._position = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk):
+        self.parts.append(chunk)
+        if self.object_text is not None:
+            return
+        for offset, char in enumerate(chunk):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"' and self._start is not None:
+                self._in_string = True
+            elif char == "{":
+                if self._start is None:
+                    self._start = self._position + offset
+                self._depth += 1
+            elif char == "}" and self._start is not None:
+                self._depth -= 1
+                if self._depth == 0:
+                    end = self._position + offset + 1
+                    self.object_text = "".join(self.parts)[self._start:end]
+                    break
+        self._position += len(chunk)
+
+    # Function to pass chunks through to st.write_stream while parsing them
+    def consume(self, stream):
+        for chunk in stream:
+            self.feed(chunk)
+            yield chunk
+
+    def result(self):
+        if self.object_text is not None:
+            try:
+                return json.loads(self.object_text)
+            except json.JSONDecodeError:
+                pass
+
+        # Fall back to parsing the whole response
+        response_text = "".join(self.parts).strip()
+        try:
+            return json.loads(response_text)
+        except json.JSONDecodeError:
+            # Use regex to extract JSON part if AI adds extra text
+            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
+            if json_match:
+                try:
+                    return json.loads(json_match.group())
+                except json.JSONDecodeError:
+                    pass
+
+        # If all fails, return error
+        return {"error": "Invalid AI response format"}
+
+
+# Function to check that a response holds a JSON object; pass it as `validate` so
+# unparseable output is never cached
+def is_json_response(text):
+    parser = StreamingJSONParser()
+    parser.feed(text)
+    return "error" not in parser.result()
+
+
+# One in-flight model request whose chunks are shared by every session asking for it
+class _Flight:
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.waiters = 0
+        self._cond = threading.Condition()
+
+    def publish(self, chunk):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    # Function to replay the chunks received so far and then follow the live stream
+    def follow(self):
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    self._cond.wait()
+                pending = self.chunks[index:]
+                index += len(pending)
+                finished = self.done and index >= len(self.chunks)
+                error = self.error
+            yield from pending
+            if finished:
+                if error is not None:
+                    raise error
+                return
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+flight_stats = {"leaders": 0, "coalesced": 0}
+
+
+# Function run in a background thread: perform one request and publish its chunks.
+# It runs independently of any session, so a viewer leaving early does not cancel the
+# call for the others and the result still reaches the cache.
+def _run_flight(key, flight, model_name, contents, cache, validate, page, kwargs):
+    try:
+        parts = []
+        with track(page, "generate_content", payload_size(contents)) as span:
+            for text in limited_stream(
+                lambda: stream_text(get_model(model_name).generate_content(contents, stream=True, **kwargs), span)
+            ):
+                parts.append(text)
+                flight.publish(text)
+        # Only complete responses are stored, and only if the caller accepts them
+        text = "".join(parts)
+        if cache is not None and text and (validate is None or validate(text)):
+            cache.put(key, model_name, text)
+        flight.finish()
+    except Exception as error:
+        flight.finish(error)
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+
+
+# Function to stream the text of a model response under the shared limits.
+# Responses are cached on disk by model, settings, prompt and attachment hashes;
+# a repeated request is answered from the cache without calling the model, and
+# identical requests already in flight are joined instead of being sent again.
+# `validate(text)` decides whether a response may be cached; a cached response it rejects
+# is evicted and asked again. `refresh` skips the cached response but stores the new one.
+def stream_content(model_name, contents, use_cache=True, page="unknown", validate=None, refresh=False, **kwargs):
+    cache = get_response_cache() if use_cache else None
+    key = request_key(model_name, contents, **kwargs)
+    if cache is not None and not refresh:
+        started = time.perf_counter()
+        cached = cache.get(key)
+        if cached is not None and validate is not None and not validate(cached):
+            cache.delete(key)
+            cached = None
+        if cached is not None:
+            record(page, "response_cache_hit", time.perf_counter() - started)
+            yield cached
+            return
+
+    joined = False
+    with _flights_lock:
+        flight = _flights.get(key)
+        if flight is None:
+            flight = _flights[key] = _Flight()
+            flight_stats["leaders"] += 1
+            threading.Thread(
+                target=_run_flight, args=(key, flight, model_name, contents, cache, validate, page, kwargs),
+                daemon=True,
+            ).start()
+        else:
+            flight.waiters += 1
+            flight_stats["coalesced"] += 1
+            joined = True
+
+    try:
+        yield from flight.follow()
+    finally:
+        # Also reached when the caller stops reading early
+        if joined:
+            with _flights_lock:
+                flight.waiters -= 1
+
+
+# Function to report request coalescing: calls made, requests that joined one, and live waiters
+def coalescing_snapshot():
+    with _flights_lock:
+        return dict(flight_stats, in_flight=len(_flights),
+                    waiting=sum(flight.waiters for flight in _flights.values()))
+
+
+# Function to get the full text of a model response, through the same cache and limits
+def generate_text(model_name, contents, use_cache=True, page="unknown", validate=None, refresh=False, **kwargs):
+    return "".join(stream_content(model_name, contents, use_cache=use_cache, page=page, validate=validate,
+                                  refresh=refresh, **kwargs))
@@ -0,0 +1,144 @@
+import os
+import re
+import threading
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+# A photo reuses a stored result when both its pHash and dHash are within this many
+# bits (out of 64) of an earlier photo with the same description
+MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "10"))
+MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_SIZE", "5000"))
+TTL_SECONDS = int(os.getenv("IMAGE_CACHE_TTL", str(7 * 24 * 3600)))
+
+HASH_SIZE = 8
+PHASH_RESOLUTION = 32
+
+# Bits set in every byte value, for vectorized popcounts
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_RESOLUTION)
+
+
+def _pack(bits):
+    return np.packbits(bits.ravel()).view(">u8")[0].astype(np.uint64)
+
+
+# Function to compute the difference hash: brightness gradients of a 9x8 thumbnail
+def dhash(image):
+    pixels = np.asarray(image.convert("L").resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS), dtype=np.int16)
+    return _pack(pixels[:, 1:] > pixels[:, :-1])
+
+
+# Function to compute the perceptual hash: signs of the low-frequency DCT of a 32x32 thumbnail
+def phash(image):
+    pixels = np.asarray(image.convert("L").resize((PHASH_RESOLUTION, PHASH_RESOLUTION), Image.LANCZOS),
+                        dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    # The DC term only reflects overall brightness
+    return _pack(low > np.median(low.ravel()[1:]))
+
+
+# Function to hash image bytes into a (pHash, dHash) pair of 64-bit integers
+def image_hashes(data):
+    image = Image.open(BytesIO(data))
+    image.draft("RGB", (4 * PHASH_RESOLUTION, 4 * PHASH_RESOLUTION))
+    return np.array([phash(image), dhash(image)], dtype=np.uint64)
+
+
+# Function to normalize a food description so trivial differences still match
+def normalize_description(text):
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+# Process-wide cache of results for near-duplicate photos. The hashes live in one
+# growable (n, 2) uint64 array so a lookup is a single vectorized XOR and popcount;
+# the least recently used entry is dropped past MAX_ENTRIES.
+class ImageHashCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._hashes = np.zeros((64, 2), dtype=np.uint64)
+        self._entries = []
+        self.stats = {"hits": 0, "misses": 0, "saved_seconds": 0.0}
+
+    def _remove(self, position):
+        # Swap the last entry into the hole, keeping the array dense
+        last = len(self._entries) - 1
+        self._hashes[position] = self._hashes[last]
+        self._entries[position] = self._entries[last]
+        self._entries.pop()
+
+    def lookup(self, hashes, description, max_distance=MAX_DISTANCE):
+        description = normalize_description(description)
+        now = time.time()
+        with self._lock:
+            count = len(self._entries)
+            if count:
+                xor = np.bitwise_xor(self._hashes[:count], hashes).view(np.uint8)
+                distances = _POPCOUNT[xor].reshape(count, 2, 8).sum(axis=2, dtype=np.int32)
+                # Both hashes must agree, and the description must match
+                worst = distances.max(axis=1)
+                candidates = np.flatnonzero(worst <= max_distance)
+                candidates = [int(position) for position in candidates[np.argsort(worst[candidates], kind="stable")]
+                              if self._entries[position]["description"] == description
+                              and now - self._entries[position]["created"] <= self.ttl]
+                if candidates:
+                    position = candidates[0]
+                    entry = self._entries[position]
+                    entry["hits"] += 1
+                    entry["last_access"] = now
+                    self.stats["hits"] += 1
+                    self.stats["saved_seconds"] += entry["seconds"]
+                    return dict(entry, distance=int(worst[position]))
+            self.stats["misses"] += 1
+            return None
+
+    def store(self, hashes, description, answer, seconds):
+        now = time.time()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._remove(min(range(len(self._entries)), key=lambda i: self._entries[i]["last_access"]))
+            count = len(self._entries)
+            if count == len(self._hashes):
+                self._hashes = np.concatenate([self._hashes, np.zeros_like(self._hashes)])
+            self._hashes[count] = hashes
+            self._entries.append({
+                "description": normalize_description(description),
+                "answer": answer,
+                "seconds": seconds,
+                "created": now,
+                "last_access": now,
+                "hits": 0,
+            })
+
+    def snapshot(self):
+        with self._lock:
+            total = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, entries=len(self._entries),
+                        hit_rate=self.stats["hits"] / total if total else 0.0)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide image result cache
+def get_image_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ImageHashCache()
+        return _cache
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from PIL import Image, ImageOps, features
+
+# Preprocessing of images before they are sent to a multimodal model: decode once,
+# downscale to what the model actually looks at and re-encode at an adaptive quality.
+#   photo:    food and scene pictures; the model sees them at about 1 megapixel
+#   document: invoices and other text; kept large and at high quality so small print stays legible
+PROFILES = {
+    "photo": {"max_side": 1024, "target_bytes": 150 * 1024, "quality": 85, "min_quality": 60},
+    "document": {"max_side": 2048, "target_bytes": 600 * 1024, "quality": 92, "min_quality": 80},
+}
+# Output format: WebP where Pillow supports it, JPEG otherwise
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "webp" if features.check("webp") else "jpeg").lower()
+QUALITY_STEP = 5
+CACHE_ENTRIES = 32
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _encode(image, quality):
+    buffer = BytesIO()
+    if IMAGE_FORMAT == "webp":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+# Function to downscale and re-encode a decoded image for a profile.
+# Returns (image part, stats); `original_bytes` is the size of the upload it came from, if any.
+def prepare_pil(image, profile="photo", original_bytes=None):
+    settings = PROFILES[profile]
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        # Flatten transparency onto white, which is what a page or a plate looks like
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+        image = background
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    original_size = image.size
+    if max(image.size) > settings["max_side"]:
+        image.thumbnail((settings["max_side"], settings["max_side"]), Image.LANCZOS)
+
+    # Lower the quality step by step until the target size is met, never below the floor
+    quality = settings["quality"]
+    data = _encode(image, quality)
+    while len(data) > settings["target_bytes"] and quality - QUALITY_STEP >= settings["min_quality"]:
+        quality -= QUALITY_STEP
+        data = _encode(image, quality)
+
+    stats = {
+        "original_bytes": original_bytes,
+        "bytes": len(data),
+        "original_size": original_size,
+        "size": image.size,
+        "format": IMAGE_FORMAT,
+        "quality": quality,
+    }
+    return {"mime_type": f"image/{IMAGE_FORMAT}", "data": data}, stats
+
+
+# Function to prepare uploaded image bytes for the model. Keeps the original when it is
+# already small enough and re-encoding would not save anything. Results are cached by
+# content hash, so Streamlit reruns do not decode the same upload again.
+def prepare_image(data, mime_type, profile="photo"):
+    key = (hashlib.sha256(data).hexdigest(), profile, IMAGE_FORMAT)
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+            return cached
+
+    image = Image.open(BytesIO(data))
+    part, stats = prepare_pil(image, profile, original_bytes=len(data))
+    if stats["bytes"] >= len(data) and stats["size"] == stats["original_size"]:
+        part = {"mime_type": mime_type, "data": data}
+        stats.update(bytes=len(data), format="original", quality=None)
+    stats["saved_bytes"] = len(data) - stats["bytes"]
+
+    with _cache_lock:
+        _cache[key] = (part, stats)
+        while len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return part, stats
+
+
+# Function to describe the savings of a prepared image in one line
+def describe_savings(stats):
+    if stats["format"] == "original":
+        return f"Image sent as uploaded ({stats['bytes'] / 1024:.0f} KB)."
+    width, height = stats["size"]
+    return (f"Image sent as {width}×{height} {stats['format'].upper()} at quality {stats['quality']}: "
+            f"{stats['bytes'] / 1024:.0f} KB instead of {stats['original_bytes'] / 1024:.0f} KB "
+            f"({stats['saved_bytes'] / stats['original_bytes']:.0%} smaller).")
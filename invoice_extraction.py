@@ -0,0 +1,319 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from gemini_client import StreamingJSONParser, backoff_delay, generate_text, is_json_response, stream_content
+from image_prep import prepare_image, prepare_pil
+
+MODEL_NAME = "gemini-1.5-flash"
+# Invoices extracted at once in batch mode; the shared Gemini gate still applies on top
+EXTRACTION_CONCURRENCY = int(os.getenv("INVOICE_CONCURRENCY", "8"))
+# Attempts per invoice before it is marked as failed (transient API errors are retried
+# inside gemini_client as well; these attempts also cover unusable model output)
+MAX_ATTEMPTS = int(os.getenv("INVOICE_MAX_ATTEMPTS", "3"))
+# Rendering of PDF pages sent to the model
+PDF_DPI = 150
+MAX_PDF_PAGES = 10
+# Structured records kept in memory for follow-up questions (the model output behind
+# them is also in the persistent response cache, so a restart does not re-extract)
+RECORD_CACHE_ENTRIES = 256
+
+AMOUNT_FIELDS = ("subtotal", "tax", "total")
+RESULT_COLUMNS = ["File", "Pages", "Vendor", "Invoice Number", "Date", "Currency", "Subtotal", "Tax", "Total",
+                  "Line Items", "Attempts", "Status"]
+LINE_ITEM_COLUMNS = ["File", "Description", "Quantity", "Unit Price", "Amount"]
+
+EXTRACTION_PROMPT = """
+You are an expert in understanding invoices in any language. Extract the invoice shown in the
+image(s) (all images are pages of the same invoice) and return **ONLY a valid JSON object**:
+{
+    "vendor": "name of the issuing company",
+    "invoice_number": "invoice number as printed",
+    "date": "invoice date as YYYY-MM-DD",
+    "currency": "ISO 4217 code, e.g. USD",
+    "subtotal": 0.0,
+    "tax": 0.0,
+    "total": 0.0,
+    "line_items": [{"description": "", "quantity": 0, "unit_price": 0.0, "amount": 0.0}],
+    "other_fields": {"label as printed": "value"}
+}
+Put every other piece of information printed on the invoice (addresses, buyer, due date,
+payment terms, bank details, notes, ...) into "other_fields".
+Use null for anything not present on the invoice. Amounts are plain numbers without symbols.
+"""
+
+QA_PROMPT = """
+You are an expert in understanding invoices. Answer the question using only this invoice record
+extracted from the invoice image. If the record does not contain the answer, say so.
+If no question is given, summarize the invoice.
+"""
+
+# Phrases that identify a question about one field of the record. Only unambiguous
+# phrasings: anything vaguer goes to the model, which sees the whole record.
+FIELD_PHRASES = {
+    "vendor": ("vendor", "seller", "supplier", "issued by", "who issued", "billed by", "merchant"),
+    "invoice_number": ("invoice number", "invoice no", "invoice #", "invoice id", "bill number", "reference number"),
+    "date": ("invoice date", "issue date", "date of issue", "issued on", "dated"),
+    "currency": ("currency",),
+    "subtotal": ("subtotal", "sub total", "sub-total", "net amount"),
+    "tax": ("tax", "vat", "gst", "sales tax"),
+    "total": ("total", "grand total", "total amount", "invoice total"),
+    "line_items": ("line items", "list the items", "what was bought", "what was purchased"),
+}
+# Words that make a question about some other value than the field it names, e.g. the due
+# date rather than the invoice date, the buyer rather than the vendor, a rate rather than an
+# amount, the vendor's address or the GST number. They are looked for outside the matched
+# field phrases, so "invoice number" or "list the items" still qualify.
+QUALIFIERS = re.compile(
+    r"\b(when|due|deliver\w*|ship\w*|billed to|bill to|sold to|buyer|customer|paid|payment|rate|percent\w*"
+    r"|per|each|unit|average|why|how many|count|items?|number|no|id|code|registration|exempt\w*"
+    r"|address|contact|e-?mail|phone|telephone|mobile|fax|website|bank|account|iban)\b|[%#]"
+)
+
+
+# Function to turn an uploaded invoice into image parts ready for upload:
+# one per image, or one per PDF page
+def invoice_images(name, data, mime_type):
+    if not name.lower().endswith(".pdf"):
+        return [prepare_image(data, mime_type, profile="document")[0]]
+    # Imported lazily; rendering needs poppler, only installed where PDFs are used
+    from pdf2image import convert_from_bytes
+
+    pages = convert_from_bytes(data, dpi=PDF_DPI, last_page=MAX_PDF_PAGES)
+    return [prepare_pil(page, profile="document")[0] for page in pages]
+
+
+# Function to read "1,234.50", "$ 99", "(12.00)" or 99 as a number, or None
+def parse_amount(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    # Accounting notation: an amount in parentheses is negative
+    negative = re.fullmatch(r"[^\d()]*\(.*\d.*\)[^\d()]*", str(value).strip()) is not None
+    text = re.sub(r"[^\d,.\-]", "", str(value))
+    if "," in text and text.rfind(",") > text.rfind(".") and len(text.rsplit(",", 1)[1]) in (1, 2):
+        # Decimal comma, e.g. "12,50" or "1.234,50"
+        text = text.replace(".", "").replace(",", ".")
+    try:
+        amount = float(text.replace(",", ""))
+    except ValueError:
+        return None
+    return -abs(amount) if negative else amount
+
+
+# Function to bring a model record into the fixed schema, with numeric amounts
+def normalize_invoice(record):
+    invoice = {field: record.get(field) for field in ("vendor", "invoice_number", "date", "currency")}
+    for field in AMOUNT_FIELDS:
+        invoice[field] = parse_amount(record.get(field))
+    other = record.get("other_fields")
+    invoice["other_fields"] = other if isinstance(other, dict) else {}
+    items = record.get("line_items") or []
+    invoice["line_items"] = [
+        {
+            "description": item.get("description"),
+            "quantity": parse_amount(item.get("quantity")),
+            "unit_price": parse_amount(item.get("unit_price")),
+            "amount": parse_amount(item.get("amount")),
+        }
+        for item in items if isinstance(item, dict)
+    ]
+    return invoice
+
+
+# Function to extract the structured record of one invoice from its image parts.
+# `refresh` asks the model again instead of reusing the cached output, and caches the new one.
+def extract_invoice(images, refresh=False):
+    parser = StreamingJSONParser()
+    parser.feed(generate_text(MODEL_NAME, [EXTRACTION_PROMPT, *images], page="invoice",
+                              validate=is_json_response, refresh=refresh))
+    record = parser.result()
+    if "error" in record:
+        raise ValueError(record["error"])
+    return normalize_invoice(record)
+
+
+# Function to extract an invoice with up to MAX_ATTEMPTS attempts; retries ask the model
+# again instead of reusing the cached output that just failed.
+# Returns (record, attempts made); the last error is raised if every attempt fails.
+def extract_with_retries(images):
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return extract_invoice(images, refresh=attempt > 0), attempt + 1
+        except Exception:
+            if attempt + 1 == MAX_ATTEMPTS:
+                raise
+        time.sleep(backoff_delay(attempt))
+
+
+# Function to make the result row of an invoice before extraction
+def new_row(name):
+    row = dict.fromkeys(RESULT_COLUMNS)
+    row.update({"File": name, "Attempts": 0, "Status": "pending", "line_items": []})
+    return row
+
+
+def _fill_row(row, invoice):
+    row.update({
+        "Vendor": invoice["vendor"],
+        "Invoice Number": invoice["invoice_number"],
+        "Date": invoice["date"],
+        "Currency": invoice["currency"],
+        "Subtotal": invoice["subtotal"],
+        "Tax": invoice["tax"],
+        "Total": invoice["total"],
+        "Line Items": len(invoice["line_items"]),
+        "line_items": invoice["line_items"],
+        "Status": "ok",
+    })
+
+
+# Function to extract the invoices at `indexes`, at most `concurrency` at once. Each invoice
+# is retried on its own up to MAX_ATTEMPTS times; a failure never stops the rest of the batch.
+# `invoices` holds (name, bytes, mime type); rows are updated in place and
+# `on_result(index, done, total)` is called from the caller's thread as each one finishes.
+async def aextract_invoices(invoices, rows, indexes, concurrency=EXTRACTION_CONCURRENCY, on_result=None):
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+
+    async def extract(index):
+        nonlocal done
+        name, data, mime_type = invoices[index]
+        row = rows[index]
+        async with semaphore:
+            try:
+                images = await asyncio.to_thread(invoice_images, name, data, mime_type)
+                row["Pages"] = len(images)
+            except Exception as e:
+                images = None
+                row["Status"] = f"Could not read file: {type(e).__name__}: {e}"
+            if images:
+                try:
+                    invoice, attempts = await asyncio.to_thread(extract_with_retries, images)
+                    row["Attempts"] += attempts
+                    _fill_row(row, invoice)
+                    store_record(content_hash(images), invoice)
+                except Exception as e:
+                    row["Attempts"] += MAX_ATTEMPTS
+                    row["Status"] = f"{type(e).__name__}: {e}"
+        done += 1
+        if on_result:
+            on_result(index, done, len(indexes))
+
+    await asyncio.gather(*(extract(index) for index in indexes))
+    return rows
+
+
+# Function to run batch extraction from synchronous code such as a Streamlit script
+def extract_invoices(invoices, rows, indexes, concurrency=EXTRACTION_CONCURRENCY, on_result=None):
+    return asyncio.run(aextract_invoices(invoices, rows, indexes, concurrency, on_result))
+
+
+# Function to list the line items of every extracted invoice, one row each
+def line_item_rows(rows):
+    items = []
+    for row in rows:
+        for item in row["line_items"]:
+            items.append({"File": row["File"], "Description": item["description"], "Quantity": item["quantity"],
+                          "Unit Price": item["unit_price"], "Amount": item["amount"]})
+    return items
+
+
+_records = OrderedDict()
+_records_lock = threading.Lock()
+
+
+# Function to compute the content hash identifying an invoice's images
+def content_hash(images):
+    digest = hashlib.sha256()
+    for part in images:
+        digest.update(hashlib.sha256(part["data"]).digest())
+    return digest.hexdigest()
+
+
+# Function to get the cached record for a content hash, or None
+def cached_record(key):
+    with _records_lock:
+        record = _records.get(key)
+        if record is not None:
+            _records.move_to_end(key)
+        return record
+
+
+# Function to get the structured record of an invoice, extracting it on first use only.
+# Returns (content hash, record, whether it was extracted by this call).
+def get_record(images):
+    key = content_hash(images)
+    record = cached_record(key)
+    if record is not None:
+        return key, record, False
+    record, _ = extract_with_retries(images)
+    store_record(key, record)
+    return key, record, True
+
+
+# Function to keep the record of an invoice for later questions
+def store_record(key, record):
+    with _records_lock:
+        _records[key] = record
+        _records.move_to_end(key)
+        while len(_records) > RECORD_CACHE_ENTRIES:
+            _records.popitem(last=False)
+
+
+def _format_amount(value, currency):
+    return f"{currency or ''} {value:,.2f}".strip()
+
+
+# Function to answer a question about a single field straight from the record.
+# Returns None when the question is not about exactly one known, present field.
+def lookup_answer(question, record):
+    text = question.lower()
+
+    def mentions(phrase):
+        return re.search(rf"(?<!\w){re.escape(phrase.lower())}(?!\w)", text) is not None
+
+    # A label printed on the invoice, like "Due Date", is answered as written
+    labels = [label for label in record["other_fields"] if label and mentions(label)]
+    for label in labels:
+        text = text.replace(label.lower(), " ")
+    matched = [field for field, phrases in FIELD_PHRASES.items() if any(mentions(phrase) for phrase in phrases)]
+    # "total tax" is a question about tax, not about the total
+    if "total" in matched and re.search(r"\btotal (tax|vat|gst)\b", text):
+        matched.remove("total")
+    phrases = sorted((phrase.lower() for field in matched for phrase in FIELD_PHRASES[field]), key=len, reverse=True)
+    rest = text
+    for phrase in phrases:
+        rest = re.sub(rf"(?<!\w){re.escape(phrase)}(?!\w)", " ", rest)
+    if QUALIFIERS.search(rest):
+        return None
+    matched += labels
+    if len(matched) != 1:
+        return None
+
+    field = matched[0]
+    if field not in FIELD_PHRASES:
+        return f"**{field}:** {record['other_fields'][field]}"
+    value = record[field]
+    if value in (None, "", []):
+        return None
+    if field in AMOUNT_FIELDS:
+        return f"**{field.capitalize()}:** {_format_amount(value, record['currency'])}"
+    if field == "line_items":
+        lines = []
+        for item in value:
+            amount = "" if item["amount"] is None else f" — {_format_amount(item['amount'], record['currency'])}"
+            quantity = "" if item["quantity"] is None else f"{item['quantity']:g} × "
+            lines.append(f"- {quantity}{item['description']}{amount}")
+        return "\n".join(lines)
+    return f"**{field.replace('_', ' ').capitalize()}:** {value}"
+
+
+# Function to stream an answer from a text-only model call over the record (no image upload)
+def answer_question(question, record):
+    yield from stream_content(MODEL_NAME, [QA_PROMPT, json.dumps(record, ensure_ascii=False), question or ""],
+                              page="invoice")
@@ -0,0 +1,291 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from fake_gemini_server import FakeConfig, start_server
+
+# Load driver for the whole suite. Runs scripted sessions of each page through the same
+# shared modules the pages use (gemini_client, embedding_pipeline, vector_store, retrieval),
+# at a target concurrency, against the fake server or any GEMINI_API_ENDPOINT:
+#   python load_test.py --scenarios ats,pdf,invoice --concurrency 16 --sessions 200
+#   python load_test.py --endpoint http://localhost:8765 --duration 60 --json report.json
+# Caches, traces and indexes are written to a scratch directory, never the app's own files.
+
+SCENARIOS = ("ats", "pdf", "invoice", "calorie", "youtube", "classify")
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+MODEL_NAME = "gemini-1.5-flash"
+PDF_MODEL_NAME = "gemini-1.5-pro"
+
+WORDS = ("python sql cloud aws docker revenue growth customer pipeline model training data analysis "
+         "dashboard report design testing deployment kubernetes spark streaming latency").split()
+
+
+# Function to make filler text; sessions sharing a seed send identical requests
+def synthetic_text(seed, words):
+    rng = random.Random(seed)
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def _image_parts():
+    parts = []
+    for name in sorted(os.listdir(ASSETS_DIR)):
+        extension = name.rsplit(".", 1)[-1].lower()
+        if extension in ("jpg", "jpeg", "png"):
+            with open(os.path.join(ASSETS_DIR, name), "rb") as f:
+                mime = "image/png" if extension == "png" else "image/jpeg"
+                parts.append({"mime_type": mime, "data": f.read()})
+    return parts
+
+
+# Function to consume a text stream, returning (time to first chunk, full text)
+def _drain(chunks, started):
+    first = None
+    parts = []
+    for chunk in chunks:
+        if first is None:
+            first = time.perf_counter() - started
+        parts.append(chunk)
+    return first, "".join(parts)
+
+
+# Scripted sessions, one per page. Each returns the time to the first streamed chunk (or None).
+class Sessions:
+    def __init__(self, args, workdir):
+        from embedding_pipeline import load_backend
+
+        self.args = args
+        self.workdir = workdir
+        self.images = _image_parts()
+        self.embeddings = load_backend("gemini") if "pdf" in args.scenarios else None
+        self.classifier = None
+        self._classifier_lock = threading.Lock()
+
+    def seed(self, scenario):
+        # A fraction of sessions repeat an earlier request, exercising caches and coalescing
+        if random.random() < self.args.repeat_fraction:
+            return f"{scenario}-{random.randrange(self.args.distinct)}"
+        return f"{scenario}-{uuid.uuid4().hex}"
+
+    def ats(self, seed):
+        from gemini_client import stream_content
+
+        resume = synthetic_text(seed, 600)
+        jd = synthetic_text(seed + "-jd", 200)
+        prompt = f"""
+        Act as a highly skilled ATS (Applicant Tracking System) with deep expertise in tech fields.
+        resume: {resume}
+        description: {jd}
+        Response format:
+        {{"JD Match":"%","MissingKeywords":[],"Profile Summary":""}}
+        """
+        started = time.perf_counter()
+        first, text = _drain(stream_content(MODEL_NAME, prompt, page="ats"), started)
+        json.loads(text[text.find("{"):text.rfind("}") + 1])
+        return first
+
+    def pdf(self, seed):
+        from gemini_client import stream_content
+        from metrics import track
+        from retrieval import pack_context
+        from vector_store import build_namespace, open_vector_store
+
+        chunks = [synthetic_text(f"{seed}-{i}", 300) for i in range(self.args.pdf_chunks)]
+        index_dir, _ = build_namespace(seed, chunks, self.embeddings, root=os.path.join(self.workdir, "faiss_index"))
+        store = open_vector_store(index_dir, self.embeddings)
+        first = None
+        for question in range(self.args.pdf_questions):
+            query = f"What does the document say about {random.choice(WORDS)}? ({seed}-{question})"
+            started = time.perf_counter()
+            with track("chat_with_pdf", "similarity_search"):
+                docs, _ = pack_context(store, self.embeddings.embed_query(query))
+            context = "\n\n".join(doc.page_content for doc in docs)
+            prompt = f"Context:\n {context}?\nQuestion: \n{query}\n\nAnswer:"
+            ttft, _ = _drain(stream_content(PDF_MODEL_NAME, prompt, page="chat_with_pdf"), started)
+            first = first if first is not None else ttft
+        return first
+
+    def _vision(self, seed, page, prompt):
+        from gemini_client import stream_content
+
+        image = random.Random(seed).choice(self.images)
+        started = time.perf_counter()
+        first, _ = _drain(stream_content(MODEL_NAME, [prompt, image, seed], page=page), started)
+        return first
+
+    def invoice(self, seed):
+        return self._vision(seed, "invoice", "You are an expert in understanding invoices.")
+
+    def calorie(self, seed):
+        return self._vision(seed, "calorie", "You are an expert nutritionist. Give the total calories.")
+
+    def youtube(self, seed):
+        from gemini_client import stream_content
+
+        prompt = "You are a YouTube video summarizer. Summarize the transcript in 250 words: "
+        started = time.perf_counter()
+        first, _ = _drain(stream_content(MODEL_NAME, prompt + synthetic_text(seed, 3000), page="youtube"), started)
+        return first
+
+    def classify(self, seed):
+        import numpy as np
+        import tensorflow as tf
+        from PIL import Image
+        from io import BytesIO
+        from metrics import track
+
+        with self._classifier_lock:
+            if self.classifier is None:
+                self.classifier = tf.keras.applications.MobileNetV2(weights="imagenet")
+        image = Image.open(BytesIO(random.Random(seed).choice(self.images)["data"])).convert("RGB")
+        batch = np.expand_dims(np.array(image.resize((224, 224))) / 255.0, axis=0)
+        with track("image_classifier", "predict", batch.nbytes):
+            self.classifier.predict(batch, verbose=0)
+        return None
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Function to run sessions at the target concurrency until the session count or duration is reached
+def run(args, sessions):
+    results = {scenario: {"latencies": [], "ttfts": [], "errors": 0, "last_error": None} for scenario in args.scenarios}
+    lock = threading.Lock()
+    counter = iter(range(args.sessions)) if args.sessions else itertools.count()
+    deadline = time.monotonic() + args.duration if args.duration else None
+
+    def worker():
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None or (deadline and time.monotonic() > deadline):
+                return
+            scenario = args.scenarios[index % len(args.scenarios)]
+            started = time.perf_counter()
+            try:
+                ttft = getattr(sessions, scenario)(sessions.seed(scenario))
+                error = None
+            except Exception as e:
+                ttft, error = None, f"{type(e).__name__}: {e}"
+            elapsed = time.perf_counter() - started
+            with lock:
+                result = results[scenario]
+                if error is None:
+                    result["latencies"].append(elapsed)
+                    if ttft is not None:
+                        result["ttfts"].append(ttft)
+                else:
+                    result["errors"] += 1
+                    result["last_error"] = error
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        for _ in range(args.concurrency):
+            pool.submit(worker)
+    wall = time.perf_counter() - started
+
+    report = {"concurrency": args.concurrency, "wall_seconds": wall, "scenarios": {}}
+    for scenario, result in results.items():
+        latencies = sorted(result["latencies"])
+        ttfts = sorted(result["ttfts"])
+        report["scenarios"][scenario] = {
+            "sessions": len(latencies),
+            "errors": result["errors"],
+            "sessions_per_sec": len(latencies) / wall if wall else 0.0,
+            "p50_ms": _percentile(latencies, 0.50) * 1000,
+            "p95_ms": _percentile(latencies, 0.95) * 1000,
+            "p99_ms": _percentile(latencies, 0.99) * 1000,
+            "ttft_p50_ms": _percentile(ttfts, 0.50) * 1000,
+            "ttft_p99_ms": _percentile(ttfts, 0.99) * 1000,
+            "last_error": result["last_error"],
+        }
+    return report
+
+
+def print_report(report, operations):
+    print(f"\n{report['concurrency']} concurrent sessions for {report['wall_seconds']:.1f} s")
+    print(f"{'scenario':<10} {'sessions':>8} {'errors':>6} {'sess/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'ttft p50':>9} {'ttft p99':>9}")
+    for scenario, row in report["scenarios"].items():
+        print(f"{scenario:<10} {row['sessions']:>8} {row['errors']:>6} {row['sessions_per_sec']:>8.2f} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} "
+              f"{row['ttft_p50_ms']:>9.1f} {row['ttft_p99_ms']:>9.1f}")
+        if row["last_error"]:
+            print(f"{'':<10} last error: {row['last_error']}")
+
+    print(f"\n{'page':<16} {'operation':<20} {'calls':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for row in operations:
+        print(f"{row['page']:<16} {row['operation']:<20} {row['calls']:>6} {row['errors']:>6} "
+              f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the suite's model paths offline.")
+    parser.add_argument("--scenarios", default="ats,pdf,invoice,calorie,youtube",
+                        help=f"Comma-separated subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=100, help="Total sessions (0 to run for --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="Stop starting sessions after this many seconds")
+    parser.add_argument("--repeat-fraction", type=float, default=0.0,
+                        help="Fraction of sessions that repeat one of --distinct earlier requests")
+    parser.add_argument("--distinct", type=int, default=10)
+    parser.add_argument("--pdf-chunks", type=int, default=50)
+    parser.add_argument("--pdf-questions", type=int, default=3)
+    parser.add_argument("--endpoint", help="Use a running server instead of starting the fake one in-process")
+    parser.add_argument("--rpm", type=float, help="Override GEMINI_RPM for this run")
+    parser.add_argument("--max-in-flight", type=int, help="Override GEMINI_MAX_IN_FLIGHT for this run")
+    parser.add_argument("--ttft-ms", type=float, default=FakeConfig.ttft_ms)
+    parser.add_argument("--tokens-per-sec", type=float, default=FakeConfig.tokens_per_sec)
+    parser.add_argument("--error-rate", type=float, default=FakeConfig.error_rate)
+    parser.add_argument("--workdir", help="Directory for caches, traces and indexes (default: a new temp dir)")
+    parser.add_argument("--trace", action="store_true", help="Write traces.jsonl into the work directory")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    if not args.sessions and not args.duration:
+        parser.error("set --sessions or --duration")
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    endpoint = args.endpoint
+    if endpoint is None:
+        _, endpoint = start_server(FakeConfig(ttft_ms=args.ttft_ms, tokens_per_sec=args.tokens_per_sec,
+                                              error_rate=args.error_rate))
+
+    # The shared modules read their settings at import time, so configure before importing them
+    os.environ["GEMINI_API_ENDPOINT"] = endpoint
+    os.environ.setdefault("GOOGLE_API_KEY", "fake-key")
+    if args.rpm is not None:
+        os.environ["GEMINI_RPM"] = str(args.rpm)
+        os.environ["GEMINI_BURST"] = str(max(1, int(args.rpm // 60)))
+    if args.max_in_flight is not None:
+        os.environ["GEMINI_MAX_IN_FLIGHT"] = str(args.max_in_flight)
+    if not args.trace:
+        os.environ["METRICS_TRACE_PATH"] = ""
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="load-test-"))
+    os.makedirs(workdir, exist_ok=True)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(workdir)
+
+    from metrics import snapshot
+
+    print(f"Endpoint: {endpoint} · work directory: {workdir}")
+    report = run(args, Sessions(args, workdir))
+    operations = snapshot()
+    print_report(report, operations)
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(dict(report, operations=operations), f, indent=2)
@@ -0,0 +1,154 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Samples kept per (page, operation) for the rolling latency percentiles
+WINDOW = int(os.getenv("METRICS_WINDOW", "1000"))
+# JSONL trace of every recorded call; set METRICS_TRACE_PATH to an empty string to disable.
+# The file is kept open and buffered, flushed at most every TRACE_FLUSH_SECONDS, and moved
+# to "<path>.1" (replacing the previous one) once it grows past METRICS_TRACE_MB.
+TRACE_PATH = os.getenv("METRICS_TRACE_PATH", "traces.jsonl")
+TRACE_MAX_BYTES = int(float(os.getenv("METRICS_TRACE_MB", "50")) * 1024 * 1024)
+TRACE_FLUSH_SECONDS = 1.0
+
+_lock = threading.Lock()
+_trace_lock = threading.Lock()
+_trace_file = None
+_trace_flushed = 0.0
+_series = {}
+
+
+def _new_series():
+    return {
+        "durations": deque(maxlen=WINDOW),
+        "calls": 0,
+        "errors": 0,
+        "cancelled": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "payload_bytes": 0,
+        "last_error": None,
+    }
+
+
+# Function to record one call of an operation. A cancelled call (abandoned stream,
+# Streamlit rerun or stop) is counted on its own and kept out of the latency percentiles.
+def record(page, operation, seconds, error=None, input_tokens=None, output_tokens=None, payload_bytes=None,
+           cancelled=False):
+    with _lock:
+        series = _series.setdefault((page, operation), _new_series())
+        if cancelled:
+            series["cancelled"] += 1
+        else:
+            series["durations"].append(seconds)
+            series["calls"] += 1
+        series["input_tokens"] += input_tokens or 0
+        series["output_tokens"] += output_tokens or 0
+        series["payload_bytes"] += payload_bytes or 0
+        if error is not None:
+            series["errors"] += 1
+            series["last_error"] = error
+
+    if TRACE_PATH:
+        line = json.dumps({
+            "ts": time.time(),
+            "page": page,
+            "operation": operation,
+            "ms": round(seconds * 1000, 3),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "payload_bytes": payload_bytes,
+            "error": error,
+            "cancelled": cancelled,
+        })
+        _write_trace(line)
+
+
+# Function to append one line to the trace file, rotating it when it is full
+def _write_trace(line):
+    global _trace_file, _trace_flushed
+    with _trace_lock:
+        if _trace_file is None:
+            _trace_file = open(TRACE_PATH, "a", encoding="utf-8")
+        _trace_file.write(line + "\n")
+        if _trace_file.tell() >= TRACE_MAX_BYTES:
+            _trace_file.close()
+            os.replace(TRACE_PATH, TRACE_PATH + ".1")
+            _trace_file = open(TRACE_PATH, "a", encoding="utf-8")
+        now = time.monotonic()
+        if now - _trace_flushed >= TRACE_FLUSH_SECONDS:
+            _trace_file.flush()
+            _trace_flushed = now
+
+
+# Function to write out any buffered trace lines, run when the process exits
+def flush_trace():
+    with _trace_lock:
+        if _trace_file is not None:
+            _trace_file.flush()
+
+
+atexit.register(flush_trace)
+
+
+# Context manager timing a block. The yielded dict can be filled with
+# input_tokens / output_tokens / payload_bytes before the block ends.
+@contextmanager
+def track(page, operation, payload_bytes=None):
+    span = {"payload_bytes": payload_bytes}
+    started = time.perf_counter()
+    error = None
+    cancelled = False
+    try:
+        yield span
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    except BaseException:
+        # GeneratorExit, KeyboardInterrupt and Streamlit's rerun/stop are not failures
+        cancelled = True
+        raise
+    finally:
+        record(page, operation, time.perf_counter() - started, error=error,
+               input_tokens=span.get("input_tokens"), output_tokens=span.get("output_tokens"),
+               payload_bytes=span.get("payload_bytes"), cancelled=cancelled)
+
+
+def _percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+# Function to summarize every (page, operation) with call counts, errors, tokens and p50/p95/p99
+def snapshot():
+    rows = []
+    with _lock:
+        items = [(key, dict(series, durations=sorted(series["durations"]))) for key, series in _series.items()]
+    for (page, operation), series in sorted(items):
+        durations = series["durations"]
+        rows.append({
+            "page": page,
+            "operation": operation,
+            "calls": series["calls"],
+            "errors": series["errors"],
+            "cancelled": series["cancelled"],
+            "p50_ms": _percentile(durations, 0.50) * 1000,
+            "p95_ms": _percentile(durations, 0.95) * 1000,
+            "p99_ms": _percentile(durations, 0.99) * 1000,
+            "input_tokens": series["input_tokens"],
+            "output_tokens": series["output_tokens"],
+            "payload_bytes": series["payload_bytes"],
+            "last_error": series["last_error"],
+        })
+    return rows
+
+
+# Function to clear the in-process histograms (the trace file is left alone)
+def reset():
+    with _lock:
+        _series.clear()
@@ -0,0 +1,85 @@
+import streamlit as st
+import pandas as pd
+from answer_cache import get_answer_cache
+from background_removal import mask_cache_snapshot
+from gemini_client import coalescing_snapshot, gate
+from image_hash_cache import get_image_cache
+from metrics import TRACE_MAX_BYTES, TRACE_PATH, reset, snapshot
+from response_cache import get_response_cache
+
+# Streamlit Page Configuration
+st.set_page_config(page_title="Admin Metrics", page_icon="📟", layout="wide")
+
+st.title("📟 Admin Metrics")
+st.markdown("Live latency, token and error statistics for every model call in this server process.")
+
+# Sidebar Controls
+st.sidebar.header("⚙️ Controls")
+refresh_seconds = st.sidebar.slider("🔄 Refresh every (seconds)", 1, 30, 3)
+if st.sidebar.button("🧹 Reset Histograms"):
+    reset()
+st.sidebar.write(f"📝 Trace file: `{TRACE_PATH or 'disabled'}`")
+if TRACE_PATH:
+    st.sidebar.caption(f"Rotated to `{TRACE_PATH}.1` at {TRACE_MAX_BYTES / 1024 / 1024:.0f} MB")
+
+
+# Live section, re-rendered on a timer without rerunning the whole page
+@st.fragment(run_every=refresh_seconds)
+def live_metrics():
+    rows = snapshot()
+
+    st.subheader("⏱️ Latency per Page and Operation")
+    if rows:
+        df = pd.DataFrame(rows)
+        pages = sorted(df["page"].unique())
+        selected = st.multiselect("Filter pages", pages, default=pages)
+        df = df[df["page"].isin(selected)]
+        st.dataframe(
+            df.style.format({"p50_ms": "{:.1f}", "p95_ms": "{:.1f}", "p99_ms": "{:.1f}"}),
+            use_container_width=True,
+            hide_index=True,
+        )
+        st.bar_chart(df.set_index(df["page"] + " · " + df["operation"])[["p50_ms", "p95_ms", "p99_ms"]])
+    else:
+        st.info("No calls recorded yet. Use any tool in the suite and come back.")
+
+    st.subheader("🚦 Gemini Client")
+    col1, col2, col3, col4 = st.columns(4)
+    gate_stats = gate.snapshot()
+    coalescing = coalescing_snapshot()
+    col1.metric("In flight", gate_stats["in_flight"])
+    col2.metric("Queued", gate_stats["queued"])
+    col3.metric("Coalesced requests", coalescing["coalesced"])
+    col4.metric("Waiting on shared calls", coalescing["waiting"])
+
+    st.subheader("🗄️ Caches")
+    col1, col2, col3, col4 = st.columns(4)
+    responses = get_response_cache().snapshot()
+    col1.markdown("**Response cache (SQLite)**")
+    col1.write(
+        f"Hit rate: {responses['hit_rate']:.0%} · Hits: {responses['hits']} · Misses: {responses['misses']} · "
+        f"Entries: {responses['entries']} · Size: {responses['bytes'] / 1024:.0f} KB · "
+        f"Evictions: {responses['evictions']}"
+    )
+    answers = get_answer_cache().snapshot()
+    col2.markdown("**PDF answer cache (semantic)**")
+    col2.write(
+        f"Hit rate: {answers['hit_rate']:.0%} · Hits: {answers['hits']} · Misses: {answers['misses']} · "
+        f"Entries: {answers['entries']} · Time saved: {answers['saved_seconds']:.1f} s"
+    )
+    images = get_image_cache().snapshot()
+    col3.markdown("**Calorie photo cache (perceptual hash)**")
+    col3.write(
+        f"Hit rate: {images['hit_rate']:.0%} · Hits: {images['hits']} · Misses: {images['misses']} · "
+        f"Entries: {images['entries']} · Time saved: {images['saved_seconds']:.1f} s"
+    )
+    masks = mask_cache_snapshot()
+    col4.markdown("**Background remover mask cache**")
+    col4.write(
+        f"Hit rate: {masks['hit_rate']:.0%} · Hits: {masks['hits']} · Misses: {masks['misses']} · "
+        f"Entries: {masks['entries']} · Size: {masks['bytes'] / 1024 ** 2:.0f} MB · "
+        f"Time saved: {masks['saved_seconds']:.1f} s"
+    )
+
+
+live_metrics()
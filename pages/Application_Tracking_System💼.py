@@ -1,95 +1,169 @@
 import streamlit as st
-import google.generativeai as genai
-import os
-import PyPDF2 as pdf
 from dotenv import load_dotenv
 import json
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
 import io
-import re
+import time
+import zipfile
+import pandas as pd
 from textstat import flesch_reading_ease
+from gemini_client import StreamingJSONParser, is_json_response, stream_content
+from pdf_text import extract_text
+from ats_scoring import score_resumes, wordcloud_png
+from embedding_pipeline import load_backend
+from resume_screening import (LLM_TOP_K, MODEL_NAME, RESULT_COLUMNS, analyze_resumes, build_prompt, collect_resumes,
+                              extract_resumes, prescreen, top_candidates)
 
 # Load environment variables from .env
 load_dotenv()
 
-# Configure the Google Gemini API
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
-# Function to get AI response from Gemini
+# Function to stream the AI response from Gemini
 def get_gemini_response(resume_text, job_desc):
-    model = genai.GenerativeModel("gemini-1.5-flash")
-
     # Prompt AI to return only JSON
-    prompt = f"""
-    You are an AI-powered ATS (Applicant Tracking System) specialized in resume screening. 
-    Analyze the given resume against the job description and return **ONLY a valid JSON response**.
-
-    **Output Format (STRICTLY return only JSON, no extra text):**
-    {{
-        "JD Match": "75%",
-        "MissingKeywords": ["Python", "Machine Learning", "SQL"],
-        "Profile Summary": "The resume aligns well with the job description but lacks SQL and ML experience."
-    }}
-
-    **Resume:** {json.dumps(resume_text)}
-    **Job Description:** {json.dumps(job_desc)}
-
-    **Return ONLY a valid JSON (no extra words or explanations).**
-    """
-
-    try:
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
-
-        # Attempt direct JSON parsing
-        try:
-            return json.loads(response_text)
-        except json.JSONDecodeError:
-            # Use regex to extract JSON part if AI adds extra text
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-
-        # If all fails, return error
-        return {"error": "Invalid AI response format"}
-    
-    except Exception as e:
-        return {"error": str(e)}
+    yield from stream_content(MODEL_NAME, build_prompt(resume_text, job_desc), page="ats", validate=is_json_response)
 
 # Function to extract text from the uploaded PDF
 def extract_pdf_text(uploaded_file):
-    reader = pdf.PdfReader(uploaded_file)
-    text = ""
-    for page in range(len(reader.pages)):
-        text += reader.pages[page].extract_text() or ""
-    return text.strip()
-
-# Function to generate word cloud
-def generate_wordcloud(text):
-    wordcloud = WordCloud(width=800, height=400, background_color="white").generate(text)
-    fig, ax = plt.subplots(figsize=(8, 4))
-    ax.imshow(wordcloud, interpolation='bilinear')
-    ax.axis('off')
-    return fig
+    return extract_text(uploaded_file).strip()
+
+# Function to show the keyword cloud of a text, rendered once per text as a PNG
+def show_wordcloud(text):
+    png = wordcloud_png(text)
+    if png is None:
+        st.write("No keywords found.")
+    else:
+        st.image(png, use_container_width=True)
 
 # Function to calculate readability score
 def calculate_readability_score(text):
     return flesch_reading_ease(text)
 
+# Function to load the local embedding model once per process
+@st.cache_resource
+def load_embeddings():
+    return load_backend("local")
+
+# Function to run the AI analysis for some rows of the bulk results, updating the table live
+def analyze_rows(state, jd, indexes):
+    progress = st.progress(0.0, text=f"Running AI analysis for {len(indexes)} resumes...")
+    table = st.empty()
+
+    def on_result(index, done, total):
+        progress.progress(done / total, text=f"Analyzed {done} of {total} resumes")
+        table.dataframe(results_frame(state["rows"]), use_container_width=True, hide_index=True)
+
+    analyze_resumes(state["rows"], state["texts"], jd, indexes, on_result=on_result)
+    progress.empty()
+    table.empty()
+
+# Function to screen many resumes against the JD: every resume gets an instant local score,
+# and only the best ones (or those picked afterwards) are sent to the model
+def bulk_screening(jd):
+    uploaded_files = st.file_uploader(
+        "📎 Upload Resumes (PDFs or a zip of PDFs)", type=["pdf", "zip"], accept_multiple_files=True
+    )
+    col1, col2 = st.columns(2)
+    top_k = col1.number_input("🤖 AI analysis for the top", min_value=0, value=LLM_TOP_K, step=5,
+                              help="Resumes with the best local score sent to the model. 0 for local scores only.")
+    semantic = col2.checkbox("🧠 Add semantic similarity", help="Blend in cosine similarity from a local embedding model.")
+
+    if st.button("🔍 Screen All Resumes", use_container_width=True):
+        if not uploaded_files or not jd.strip():
+            st.error("❌ Please upload resumes and provide a job description.")
+            return
+        try:
+            resumes = collect_resumes(uploaded_files)
+        except (ValueError, zipfile.BadZipFile) as e:
+            st.error(f"❌ Could not read the upload: {e}")
+            return
+        if not resumes:
+            st.error("❌ No PDF resumes found in the upload.")
+            return
+
+        started = time.perf_counter()
+        progress = st.progress(0.0, text=f"Extracting {len(resumes)} resumes...")
+        texts, errors = extract_resumes(
+            resumes, on_progress=lambda done, total: progress.progress(done / total, text=f"Extracted {done} of {total} resumes")
+        )
+        progress.empty()
+        scoring_started = time.perf_counter()
+        rows = prescreen(resumes, texts, errors, jd, load_embeddings() if semantic else None)
+        # Published before the AI analysis, so a rerun mid-batch keeps the rows done so far;
+        # "seconds" stays None until the batch completes
+        state = st.session_state["bulk_results"] = {
+            "rows": rows, "texts": texts, "jd": jd, "scoring_seconds": time.perf_counter() - scoring_started,
+            "seconds": None,
+        }
+        analyze_rows(state, jd, top_candidates(rows, top_k))
+        state["seconds"] = time.perf_counter() - started
+
+    # Results survive reruns, e.g. the one triggered by a download button
+    state = st.session_state.get("bulk_results")
+    if state:
+        pending = [index for index, row in enumerate(state["rows"]) if row["Status"] == "not analyzed"]
+        names = {index: state["rows"][index]["File"] for index in pending}
+        selected = st.multiselect("🤖 Run AI analysis for more resumes", pending, format_func=names.get)
+        if selected and st.button("Analyze Selected"):
+            analyze_rows(state, state["jd"], selected)
+
+        df = results_frame(state["rows"])
+        analyzed = int((df["Status"] == "ok").sum())
+        failed = int((~df["Status"].isin(["ok", "not analyzed"])).sum())
+        if state.get("seconds") is None:
+            timing = "(interrupted before the AI analysis finished; pick the rest below)"
+        else:
+            timing = f"in {state['seconds']:.1f} s"
+        st.subheader("✅ **Screening Results:**")
+        st.caption(f"{len(df)} resumes {timing} (local scoring {state['scoring_seconds'] * 1000:.0f} ms) · "
+                   f"{analyzed} analyzed by AI · {failed} failed. Click a column header to sort.")
+        st.dataframe(
+            df, use_container_width=True, hide_index=True,
+            column_config={
+                "Local Score": st.column_config.ProgressColumn("Local Score", format="%.0f", min_value=0, max_value=100),
+                "JD Match": st.column_config.ProgressColumn("JD Match", format="%.0f%%", min_value=0, max_value=100),
+            },
+        )
+        col1, col2 = st.columns(2)
+        col1.download_button("📥 Download CSV", df.to_csv(index=False), file_name="ATS_Screening.csv", mime="text/csv")
+        col2.download_button("📥 Download JSON", df.to_json(orient="records", indent=2),
+                             file_name="ATS_Screening.json", mime="application/json")
+
+# Function to build the results table, best local matches first
+def results_frame(rows):
+    df = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    return df.sort_values("Local Score", ascending=False, na_position="last")
+
 # Streamlit App UI
 st.set_page_config(page_title="Smart ATS", layout="wide")
 st.title("💼 **Smart ATS: Resume Enhancer**")
 st.text("Boost Your Resume's ATS Compatibility 🚀")
 
+# One resume in depth, or a whole batch of applicants against the same JD
+mode = st.radio("Mode", ["Single resume", "Bulk screening"], horizontal=True)
+
 # Job description input
 jd = st.text_area("📄 Paste the Job Description (JD):", height=150, placeholder="Enter the job description here...")
 
-# Resume upload
-uploaded_file = st.file_uploader("📎 Upload Your Resume (PDF)", type=["pdf"], help="Please upload your resume in PDF format.")
-
-# Submit button
-submit = st.button("🔍 Analyze Resume", use_container_width=True)
+if mode == "Bulk screening":
+    bulk_screening(jd)
+    uploaded_file, submit, quick = None, False, False
+else:
+    # Resume upload
+    uploaded_file = st.file_uploader("📎 Upload Your Resume (PDF)", type=["pdf"], help="Please upload your resume in PDF format.")
+
+    # Submit buttons: full AI analysis, or the instant local score alone
+    col1, col2 = st.columns(2)
+    submit = col1.button("🔍 Analyze Resume", use_container_width=True)
+    quick = col2.button("⚡ Local Score Only", use_container_width=True)
+
+# Deterministic local score, shown straight away and before any AI analysis
+if (submit or quick) and uploaded_file is not None and jd.strip():
+    local = score_resumes([extract_pdf_text(uploaded_file)], jd)[0]
+    st.subheader("⚡ **Local Match Score:**")
+    st.markdown(f"### **{local['score']:.0f} / 100**")
+    st.progress(local["score"] / 100)
+    st.markdown("**JD keywords not found in the resume:** " + (", ".join(local["missing"]) or "none"))
+elif quick:
+    st.error("❌ Please upload a resume and provide a job description.")
 
 # When the submit button is pressed
 if submit:
@@ -98,8 +172,14 @@ if submit:
             # Extract text from the uploaded resume
             resume_text = extract_pdf_text(uploaded_file)
 
-            # Get AI analysis from Gemini
-            response = get_gemini_response(resume_text, jd)
+            # Get AI analysis from Gemini, streaming the raw output as it arrives
+            parser = StreamingJSONParser()
+            try:
+                with st.expander("🛰️ Live AI Output", expanded=True):
+                    st.write_stream(parser.consume(get_gemini_response(resume_text, jd)))
+                response = parser.result()
+            except Exception as e:
+                response = {"error": str(e)}
 
             # Check if response is valid
             if "error" in response:
@@ -139,10 +219,10 @@ if submit:
                 # Display WordClouds for JD and Resume Text
                 st.subheader("📈 **Keyword Visualization**")
                 st.markdown("### **Job Description Keywords:**")
-                st.pyplot(generate_wordcloud(jd))
+                show_wordcloud(jd)
 
                 st.markdown("### **Resume Keywords:**")
-                st.pyplot(generate_wordcloud(resume_text))
+                show_wordcloud(resume_text)
 
                 # Improvement Suggestions
                 st.subheader("💡 **Suggestions for Improvement:**")
@@ -1,29 +1,39 @@
 from dotenv import load_dotenv
+import io
+import time
+import pandas as pd
 import streamlit as st
-import os
 from PIL import Image, ImageEnhance
-import google.generativeai as genai
+from image_prep import describe_savings, prepare_image
+from invoice_extraction import (LINE_ITEM_COLUMNS, RESULT_COLUMNS, answer_question, cached_record, extract_invoices,
+                                get_record, line_item_rows, lookup_answer, new_row)
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Function to answer a question about an invoice. The image is sent to the model once to
+# extract a structured record (cached by content hash); questions are then answered by
+# field lookup, or by a text-only call over the record. Details go into `info`.
+def get_invoice_answer(image, question, info):
+    started = time.perf_counter()
+    key, record, extracted = get_record(image)
+    info.update(record_key=key, extracted=extracted)
+    answer = lookup_answer(question, record)
+    if answer is not None:
+        info.update(source="record lookup", seconds=time.perf_counter() - started)
+        yield answer
+        return
+    yield from answer_question(question, record)
+    info.update(source="text-only call over the record", seconds=time.perf_counter() - started)
 
-# Load Gemini 1.5 Flash model
-model = genai.GenerativeModel('gemini-1.5-flash')
-
-# Function to process the response from Gemini
-def get_gemini_response(input, image, user_prompt):
-    response = model.generate_content([input, image[0], user_prompt])
-    return response.text
-
-# Function to extract image details
+# Function to extract image details, downscaled and re-encoded with text kept legible.
+# Returns the image parts and the preprocessing stats.
 def input_image_details(uploaded_file):
     if uploaded_file is not None:
         bytes_data = uploaded_file.getvalue()
-        image_parts = [{"mime_type": uploaded_file.type, "data": bytes_data}]
-        return image_parts
+        image_part, stats = prepare_image(bytes_data, uploaded_file.type, profile="document")
+        image_parts = [image_part]
+        return image_parts, stats
     else:
         raise FileNotFoundError("No file uploaded")
 
@@ -37,6 +47,72 @@ def crop_image(image):
     left, top, right, bottom = 100, 100, image.width - 100, image.height - 100
     return image.crop((left, top, right, bottom))
 
+# Function to show the batch results table, as rows arrive
+def results_frame(rows):
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+# Function to extract the invoices at `indexes`, updating a live table as each one finishes
+def run_extraction(state, indexes):
+    progress = st.progress(0.0, text=f"Extracting {len(indexes)} invoices...")
+    table = st.empty()
+
+    def on_result(index, done, total):
+        progress.progress(done / total, text=f"Extracted {done} of {total} invoices")
+        table.dataframe(results_frame(state["rows"]), use_container_width=True, hide_index=True)
+
+    extract_invoices(state["invoices"], state["rows"], indexes, on_result=on_result)
+    progress.empty()
+    table.empty()
+
+# Function for batch mode: many images or PDFs in, one structured row per invoice out
+def batch_extraction():
+    uploaded_files = st.file_uploader(
+        "📂 Upload Invoices (images or PDFs)", type=["jpg", "jpeg", "png", "pdf"], accept_multiple_files=True
+    )
+    if st.button("🧾 Extract All Invoices"):
+        if not uploaded_files:
+            st.error("❌ Please upload at least one invoice.")
+            return
+        invoices = [(file.name, file.getvalue(), file.type) for file in uploaded_files]
+        # Published before extraction, so a rerun mid-batch keeps the rows done so far;
+        # "seconds" stays None until the batch completes
+        state = st.session_state["invoice_batch"] = {
+            "invoices": invoices, "rows": [new_row(name) for name, _, _ in invoices], "seconds": None,
+        }
+        started = time.perf_counter()
+        run_extraction(state, list(range(len(invoices))))
+        state["seconds"] = time.perf_counter() - started
+
+    # Results survive reruns, e.g. the ones triggered by download buttons
+    state = st.session_state.get("invoice_batch")
+    if not state:
+        return
+    failed = [index for index, row in enumerate(state["rows"]) if row["Status"] != "ok"]
+    if failed and st.button(f"🔁 Retry {len(failed)} Failed Invoices"):
+        run_extraction(state, failed)
+        failed = [index for index, row in enumerate(state["rows"]) if row["Status"] != "ok"]
+
+    df = results_frame(state["rows"])
+    items = pd.DataFrame(line_item_rows(state["rows"]), columns=LINE_ITEM_COLUMNS)
+    st.subheader("📊 Extracted Invoices")
+    if state.get("seconds") is None:
+        st.caption(f"{len(df)} invoices · interrupted before the batch finished · "
+                   f"{len(failed)} failed or not extracted yet.")
+    else:
+        st.caption(f"{len(df)} invoices in {state['seconds']:.1f} s · {len(failed)} failed.")
+    st.dataframe(df, use_container_width=True, hide_index=True)
+    with st.expander(f"🧾 Line Items ({len(items)})"):
+        st.dataframe(items, use_container_width=True, hide_index=True)
+
+    excel = io.BytesIO()
+    with pd.ExcelWriter(excel, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name="Invoices", index=False)
+        items.to_excel(writer, sheet_name="Line Items", index=False)
+    col1, col2 = st.columns(2)
+    col1.download_button("📥 Download CSV", df.to_csv(index=False), file_name="invoices.csv", mime="text/csv")
+    col2.download_button("📥 Download Excel", excel.getvalue(), file_name="invoices.xlsx",
+                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
 # Initialize Streamlit app
 st.set_page_config(page_title="📜 MultiLanguage Invoice Extractor", layout="wide")
 
@@ -49,84 +125,107 @@ with st.sidebar:
     st.write("1️⃣ Upload an invoice image (JPG, PNG, or JPEG)")
     st.write("2️⃣ Type a question (e.g., What is the total amount?)")
     st.write("3️⃣ Click the button & get AI-generated answers!")
+    st.write("Or switch to **Batch extraction** to turn many invoices into a table.")
 
 # Header Section
 st.header("📜 MultiLanguage Invoice Extractor")
 
-# User Input for Question
-input_question = st.text_input(
-    "Ask a question about the invoice:", 
-    key="input", 
-    placeholder="e.g., What is the total amount?",
-    help="Type any question about the invoice details."
-)
-
-# Image Upload
-uploaded_file = st.file_uploader("📂 Upload an Invoice Image", type=["jpg", "jpeg", "png"])
-
-# Image Processing Options
-if uploaded_file is not None:
-    # Open uploaded image
-    image = Image.open(uploaded_file)
-
-    # Display uploaded image with reduced size
-    st.image(image, caption="📷 Uploaded Image", width=500)  # Smaller image size
-
-    # Show file size warning if too large
-    image_size_mb = uploaded_file.size / (1024 * 1024)  # Convert to MB
-    if image_size_mb > 5:
-        st.warning("⚠️ The uploaded image is large. It might take longer to process.")
-
-    # Enhance Image Option
-    if st.checkbox("✨ Enhance Image"):
-        enhanced_image = enhance_image(image)
-        st.image(enhanced_image, caption="✨ Enhanced Image", width=500)
-
-    # Crop Image Option
-    if st.checkbox("✂️ Crop Image"):
-        cropped_image = crop_image(image)
-        st.image(cropped_image, caption="✂️ Cropped Image", width=500)
-
-# Store Previous Questions
-if "history" not in st.session_state:
-    st.session_state["history"] = []
-
-# Display Previous Questions
-st.subheader("🔄 Previous Questions")
-if st.session_state["history"]:
-    for idx, question in enumerate(st.session_state["history"]):
-        st.write(f"{idx+1}. {question}")
-
-# Button for Processing Invoice
-if st.button("🧠 Analyze Invoice"):
+# One invoice with free-form questions, or many invoices turned into table rows
+mode = st.radio("Mode", ["Ask questions", "Batch extraction"], horizontal=True)
+
+if mode == "Batch extraction":
+    batch_extraction()
+else:
+    # User Input for Question
+    input_question = st.text_input(
+        "Ask a question about the invoice:", 
+        key="input", 
+        placeholder="e.g., What is the total amount?",
+        help="Type any question about the invoice details."
+    )
+
+    # Image Upload
+    uploaded_file = st.file_uploader("📂 Upload an Invoice Image", type=["jpg", "jpeg", "png"])
+
+    # Image Processing Options
     if uploaded_file is not None:
-        # Store question in history
-        st.session_state["history"].append(input_question)
-
-        # Process Image & Get AI Response
-        image_data = input_image_details(uploaded_file)
-        input_prompt = """
-            You are an expert in understanding invoices. Based on the uploaded image,
-            answer any questions related to the invoice details.
-        """
-        response = get_gemini_response(input_prompt, image_data, input_question)
-
-        # Display Response
-        st.subheader("📚 AI Response:")
-        if response:
-            st.write(response)
-
-            # Option to Download Response
-            st.download_button(
-                label="📥 Download Response",
-                data=response.encode("utf-8"),
-                file_name="invoice_response.txt",
-                mime="text/plain",
-            )
+        # Open uploaded image
+        image = Image.open(uploaded_file)
+
+        # Display uploaded image with reduced size
+        st.image(image, caption="📷 Uploaded Image", width=500)  # Smaller image size
+
+        # Large photos are downscaled before upload, so their size no longer matters much
+        image_size_mb = uploaded_file.size / (1024 * 1024)  # Convert to MB
+        if image_size_mb > 5:
+            st.info("ℹ️ Large image: it will be downscaled before it is sent for analysis.")
+
+        # Enhance Image Option
+        if st.checkbox("✨ Enhance Image"):
+            enhanced_image = enhance_image(image)
+            st.image(enhanced_image, caption="✨ Enhanced Image", width=500)
+
+        # Crop Image Option
+        if st.checkbox("✂️ Crop Image"):
+            cropped_image = crop_image(image)
+            st.image(cropped_image, caption="✂️ Cropped Image", width=500)
+
+    # Store Previous Questions
+    if "history" not in st.session_state:
+        st.session_state["history"] = []
+
+    # Display Previous Questions, each linked to the invoice record it was answered from
+    st.subheader("🔄 Previous Questions")
+    if st.session_state["history"]:
+        for idx, entry in enumerate(st.session_state["history"]):
+            with st.expander(f"{idx+1}. {entry['question'] or '(no question)'}"):
+                st.markdown(entry["answer"])
+                st.caption(f"Answered by {entry['source']} · record `{entry['record_key'][:12]}`")
+                record = cached_record(entry["record_key"])
+                if record is not None:
+                    st.json(record, expanded=False)
+
+    # Button for Processing Invoice
+    if st.button("🧠 Analyze Invoice"):
+        if uploaded_file is not None:
+            # Process Image & Get AI Response
+            image_data, image_stats = input_image_details(uploaded_file)
+
+            # Display Response as it streams in
+            st.subheader("📚 AI Response:")
+            info = {}
+            error = None
+            with st.spinner("Reading the invoice..."):
+                try:
+                    response = st.write_stream(get_invoice_answer(image_data, input_question, info))
+                except Exception as e:
+                    # Unusable model output even after the retries, or an API error
+                    error = f"{type(e).__name__}: {e}"
+            if error:
+                st.error(f"⚠️ Could not read the invoice: {error}")
+            else:
+                if "seconds" in info:
+                    extraction = "after extracting the invoice record" if info["extracted"] else "using the cached invoice record"
+                    st.caption(f"⚡ Answered by {info['source']} in {info['seconds'] * 1000:.0f} ms, {extraction}.")
+                if info.get("extracted"):
+                    st.caption(describe_savings(image_stats))
+                if response:
+                    # Store question in history
+                    st.session_state["history"].append({
+                        "question": input_question, "answer": response,
+                        "record_key": info["record_key"], "source": info.get("source", "text-only call over the record"),
+                    })
+                    # Option to Download Response
+                    st.download_button(
+                        label="📥 Download Response",
+                        data=response.encode("utf-8"),
+                        file_name="invoice_response.txt",
+                        mime="text/plain",
+                    )
+                else:
+                    st.error("❌ No response received. Try again with a different question.")
         else:
-            st.error("❌ No response received. Try again with a different question.")
-    else:
-        st.error("❌ Please upload an invoice image.")
+            st.error("❌ Please upload an invoice image.")
 
 # Styling Enhancements
 st.markdown("""
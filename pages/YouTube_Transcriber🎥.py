@@ -1,16 +1,12 @@
 import streamlit as st
 from dotenv import load_dotenv
-import os
-import google.generativeai as genai
+from gemini_client import stream_content
 from youtube_transcript_api import YouTubeTranscriptApi
 import re
 
 # Load environment variables
 load_dotenv()
 
-# Configure the Google Gemini API key
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-
 # Define the prompt for generating summary
 prompt = """You are a YouTube video summarizer. You will be taking the transcript text 
 and summarizing the entire video and providing the important summary in points 
@@ -37,22 +33,19 @@ def extract_transcript_details(youtube_video_url):
         st.error(f"⚠️ Error fetching transcript: {e}")
         return None, None
 
-# Function to generate content using Google Gemini Pro
+# Function to stream content generated using Google Gemini Pro
 def generate_gemini_content(transcript_text, prompt, length):
-    try:
-        model = genai.GenerativeModel("gemini-1.5-flash")
-        response = model.generate_content(prompt + transcript_text)
-        summary = response.text
-
+    # The full response is always consumed so every summary length shares one cached call
+    emitted = 0
+    for text in stream_content("gemini-1.5-flash", prompt + transcript_text, page="youtube"):
         if length == "Short":
-            summary = summary[:150]  # Cut down summary to 150 words
-        elif length == "Long":
-            summary += " [This is a long version of the summary.]"
+            text = text[:150 - emitted]  # Cut down summary to 150 words
+        emitted += len(text)
+        if text:
+            yield text
 
-        return summary
-    except Exception as e:
-        st.error(f"❌ Error generating summary: {e}")
-        return None
+    if length == "Long":
+        yield " [This is a long version of the summary.]"
 
 # Streamlit UI Setup
 st.set_page_config(page_title="YouTube Transcript to Summary Converter", layout="wide")
@@ -90,11 +83,14 @@ if st.button("🔍 Get Detailed Notes"):
             transcript_text, video_id = extract_transcript_details(youtube_link)
             
             if transcript_text:
-                summary = generate_gemini_content(transcript_text, prompt, summary_length)
+                st.markdown("## 📑 Detailed Notes:")
+                try:
+                    summary = st.write_stream(generate_gemini_content(transcript_text, prompt, summary_length))
+                except Exception as e:
+                    st.error(f"❌ Error generating summary: {e}")
+                    summary = None
                 
                 if summary:
-                    st.markdown("## 📑 Detailed Notes:")
-                    st.write(summary)
 
                     # Word count of the summary
                     st.markdown(f"### 📝 Word Count: {len(summary.split())} words")
@@ -1,34 +1,28 @@
 from dotenv import load_dotenv
+import time
 import streamlit as st
-import os
-import google.generativeai as genai
+from gemini_client import stream_content
+from image_hash_cache import MAX_DISTANCE, get_image_cache, image_hashes
+from image_prep import describe_savings, prepare_image
 from PIL import Image
-import time
 
 # Load environment variables
 load_dotenv()
 
-# Configure the API key
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Function to load Google Gemini Pro Vision API and get response.
+# `fresh` skips the cached response for this exact request and stores the new one.
+def get_gemini_response(input, image, prompt, fresh=False):
+    yield from stream_content("gemini-1.5-flash", [input, image[0], prompt], page="calorie", refresh=fresh)
 
-# Function to load Google Gemini Pro Vision API and get response
-def get_gemini_response(input, image, prompt):
-    model = genai.GenerativeModel("gemini-1.5-flash")
-    response = model.generate_content([input, image[0], prompt])
-    return response.text
-
-# Function to handle image file upload
+# Function to handle image file upload, downscaled and re-encoded for the model.
+# Returns the image parts and the preprocessing stats.
 def input_image_setup(uploaded_file):
     if uploaded_file is not None:
         bytes_data = uploaded_file.getvalue()
 
-        image_parts = [
-            {
-                "mime_type": uploaded_file.type,
-                "data": bytes_data
-            }
-        ]
-        return image_parts
+        image_part, stats = prepare_image(bytes_data, uploaded_file.type, profile="photo")
+        image_parts = [image_part]
+        return image_parts, stats
     else:
         raise FileNotFoundError("No file uploaded")
 
@@ -72,12 +66,18 @@ if uploaded_file is not None:
         mime="image/png",
     )
 
+# Photo similarity needed to reuse an earlier result
+max_distance = st.sidebar.slider(
+    "♻️ Cache match threshold (bits)", 0, 20, MAX_DISTANCE,
+    help="How many of the 64 perceptual-hash bits may differ for a photo to count as the same meal. 0 = exact match only.",
+)
+fresh = st.sidebar.checkbox("🔄 Always run a fresh analysis")
+
 # Progress bar while the image is being processed
 if st.button("💥 **Calculate Calories**"):
     if uploaded_file is not None:
         with st.spinner("🧠 Analyzing your food... Please wait..."):
-            time.sleep(2)  # Simulate processing time
-            image_data = input_image_setup(uploaded_file)
+            image_data, image_stats = input_image_setup(uploaded_file)
 
             # Generate the response using the image and input prompt
             input_prompt = """
@@ -90,11 +90,25 @@ if st.button("💥 **Calculate Calories**"):
                 ----
                 ----
             """
-            response = get_gemini_response(input_prompt, image_data, input)
-
-            # Display the response
+            # Near-duplicate photos of the same meal reuse an earlier breakdown
             st.subheader("🍽️ **Calorie Breakdown**")
-            st.write(response)
+            started = time.perf_counter()
+            image_cache = get_image_cache()
+            hashes = image_hashes(image_data[0]["data"])
+            cached = None if fresh else image_cache.lookup(hashes, input, max_distance)
+            if cached is not None:
+                st.markdown(cached["answer"])
+                st.caption(
+                    f"♻️ Served from cache in {(time.perf_counter() - started) * 1000:.0f} ms: this photo matches "
+                    f"one analyzed {(time.time() - cached['created']) / 60:.0f} min ago "
+                    f"({cached['distance']} of 64 hash bits differ), saving about {cached['seconds']:.1f} s."
+                )
+            else:
+                # Display the response as it streams in
+                response = st.write_stream(get_gemini_response(input_prompt, image_data, input, fresh))
+                if response:
+                    image_cache.store(hashes, input, response, time.perf_counter() - started)
+                st.caption(describe_savings(image_stats))
 
     else:
         st.error("❌ **Please upload an image to calculate calories.**")
@@ -112,6 +126,13 @@ st.sidebar.write("Explore some additional features:")
 st.sidebar.write("- **Image Enhancement**: Enhance image quality before processing.")
 st.sidebar.write("- **Clear Uploaded Image**: Refresh the page to upload a new image.")
 
+cache_stats = get_image_cache().snapshot()
+st.sidebar.write(
+    f"♻️ **Result cache:** {cache_stats['hit_rate']:.0%} hit rate ({cache_stats['hits']} hits, "
+    f"{cache_stats['misses']} misses) · {cache_stats['entries']} meals stored · "
+    f"{cache_stats['saved_seconds']:.0f} s saved"
+)
+
 st.sidebar.markdown("""
     ---  
     👩‍🍳 **About the App**: This app utilizes AI to analyze your food image and calculate the calories and nutritional breakdown.  
@@ -1,14 +1,19 @@
 import streamlit as st
-from PyPDF2 import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import os
-import google.generativeai as genai
-from langchain_community.vectorstores import FAISS
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain.chains.question_answering import load_qa_chain
+from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
 from dotenv import load_dotenv
 from io import BytesIO
+import time
+from answer_cache import get_answer_cache
+from embedding_pipeline import DEFAULT_BACKEND, EMBEDDING_BACKENDS, load_backend
+from gemini_client import client_kwargs, limited_stream
+from metrics import track
+from pdf_text import iter_ordered_pages
+from retrieval import CONTEXT_TOKEN_BUDGET, pack_context
+from vector_store import (build_namespace, check_index_model, documents_hash, index_version, open_vector_store,
+                          touch_namespace)
 
 # Load environment variables
 load_dotenv()
@@ -19,32 +24,48 @@ if not API_KEY:
     st.error("🚨 API Key not found! Please set 'GOOGLE_API_KEY' in your environment variables.")
     st.stop()
 
-# Configure Gemini API
-genai.configure(api_key=API_KEY)
+# Chunking parameters for the text splitter; small chunks let the context be packed to a budget
+CHUNK_SIZE = 2000
+CHUNK_OVERLAP = 200
 
-# Function to extract text from PDF
+# Function to extract text from PDF, yielding page texts in order as they are extracted
 def get_pdf_text(pdf_docs):
-    text = ""
-    for pdf in pdf_docs:
-        pdf_reader = PdfReader(pdf)
-        for page in pdf_reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                text += page_text + "\n"
-    return text
-
-# Function to split text into chunks
-def get_text_chunks(text):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=10000, chunk_overlap=1000)
-    return text_splitter.split_text(text)
-
-# Function to generate FAISS vector store
-def get_vector_store(text_chunks):
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
-    vector_store = FAISS.from_texts(text_chunks, embedding=embeddings)
-    vector_store.save_local("faiss_index")
-
-# Function to create conversational chain
+    for page_text in iter_ordered_pages(pdf_docs):
+        if page_text:
+            yield page_text
+
+# Function to split text into chunks while pages are still being extracted
+def get_text_chunks(page_texts):
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    chunks = []
+    pending = []
+    pending_size = 0
+    for page_text in page_texts:
+        pending.append(page_text)
+        pending_size += len(page_text) + 1
+        # Split once enough text is buffered, keeping the last chunk to continue from
+        if pending_size >= 4 * CHUNK_SIZE:
+            split = text_splitter.split_text("\n".join(pending))
+            chunks.extend(split[:-1])
+            pending = split[-1:]
+            pending_size = sum(len(text) for text in pending)
+    if pending:
+        chunks.extend(text_splitter.split_text("\n".join(pending)))
+    return chunks
+
+# Function to build the FAISS vector store for a document set, embedding only chunks not seen before
+def get_vector_store(text_chunks, docs_key, backend, base_dir=None):
+    embeddings = load_embeddings(backend)
+    return build_namespace(docs_key, text_chunks, embeddings, base_dir=base_dir,
+                           model_name=EMBEDDING_BACKENDS[backend])
+
+# Function to load an embedding backend once per process
+@st.cache_resource
+def load_embeddings(backend):
+    return load_backend(backend)
+
+# Function to create conversational chain that streams the answer token by token
+@st.cache_resource
 def get_conversational_chain():
     prompt_template = """
     Context:\n {context}?\n
@@ -52,26 +73,59 @@ def get_conversational_chain():
 
     Answer:
     """
-    model = ChatGoogleGenerativeAI(model="gemini-1.5-pro", temperature=0.3)  # Corrected model name
+    model = ChatGoogleGenerativeAI(model="gemini-1.5-pro", temperature=0.3, **client_kwargs())  # Corrected model name
     prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
-    return load_qa_chain(model, chain_type="stuff", prompt=prompt)
+    return prompt | model
 
-# Function for user input and interaction
-def user_input(user_question):
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001")
+# Function for user input and interaction, yielding the answer as it streams in.
+# Similar questions against the same index are answered from the semantic answer cache.
+# Packing and cache statistics for the answer are written into `stats`.
+def user_input(user_question, index_dir, backend, token_budget, stats):
+    embeddings = load_embeddings(backend)
     
+    answer_cache = get_answer_cache()
+    namespace = (index_dir, token_budget)
     try:
-        new_db = FAISS.load_local("faiss_index", embeddings, allow_dangerous_deserialization=True)
+        check_index_model(index_dir, EMBEDDING_BACKENDS[backend])
+        touch_namespace(index_dir)
+        new_db = open_vector_store(index_dir, embeddings)
+        version = index_version(index_dir)
+
+        started = time.perf_counter()
+        query_vector = embeddings.embed_query(user_question)
+        cached = answer_cache.lookup(namespace, version, query_vector)
+        if cached is None:
+            with track("chat_with_pdf", "similarity_search"):
+                docs, packing = pack_context(new_db, query_vector, token_budget, CHUNK_OVERLAP,
+                                             chunk_chars=CHUNK_SIZE - CHUNK_OVERLAP)
     except Exception as e:
-        st.error(f"❌ Error loading vector database: {e}")
-        return "Error processing your request."
+        st.error(f"❌ Error searching the vector database: {e}")
+        yield "Error processing your request."
+        return
 
-    docs = new_db.similarity_search(user_question)
+    if cached is not None:
+        stats["cache"] = dict(cached, lookup_seconds=time.perf_counter() - started)
+        yield cached["answer"]
+        return
 
-    chain = get_conversational_chain()
-    response = chain({"input_documents": docs, "question": user_question}, return_only_outputs=True)
+    stats.update(packing)
+    context = "\n\n".join(doc.page_content for doc in docs)
 
-    return response.get("output_text", "No response generated.")
+    chain = get_conversational_chain()
+    answer = []
+    with track("chat_with_pdf", "generate_content", len(context.encode("utf-8"))) as span:
+        for chunk in limited_stream(lambda: chain.stream({"context": context, "question": user_question})):
+            usage = getattr(chunk, "usage_metadata", None)
+            if usage:
+                span["input_tokens"] = usage.get("input_tokens")
+                span["output_tokens"] = usage.get("output_tokens")
+            if chunk.content:
+                answer.append(chunk.content)
+                yield chunk.content
+
+    if answer:
+        answer_cache.store(namespace, version, query_vector, user_question, "".join(answer),
+                           time.perf_counter() - started)
 
 # Function to allow users to download processed PDFs
 def download_pdf(text):
@@ -93,21 +147,71 @@ def main():
     # Input area for asking questions
     user_question = st.text_input("🔎 Ask a question from the PDFs")
 
+    # Embedding backend: Gemini in the cloud, or a local CPU model that needs no network
+    backends = list(EMBEDDING_BACKENDS)
+    backend = st.sidebar.selectbox(
+        "🧠 Embedding backend", backends, index=backends.index(DEFAULT_BACKEND),
+        help="'local' embeds on this machine with sentence-transformers.",
+    )
+    token_budget = st.sidebar.slider(
+        "📦 Context token budget", 500, 16000, CONTEXT_TOKEN_BUDGET, step=500,
+        help="Upper bound on the PDF text sent to the model with each question.",
+    )
+
+    # Only re-process when the uploaded documents or the backend change between reruns
     if pdf_docs:
-        st.subheader("⏳ Processing Files... Please wait!")
-        with st.spinner("Extracting text from your PDFs..."):
-            raw_text = get_pdf_text(pdf_docs)
-            text_chunks = get_text_chunks(raw_text)
-            get_vector_store(text_chunks)
-            st.success("✅ PDF Processing Complete! Ready to Answer Questions 🎉")
+        docs_key = documents_hash(pdf_docs)
+        if st.session_state.get("indexed_docs") != (docs_key, backend):
+            st.subheader("⏳ Processing Files... Please wait!")
+            with st.spinner("Extracting text from your PDFs..."):
+                text_chunks = get_text_chunks(get_pdf_text(pdf_docs))
+                # Served from the extraction cache filled by the pass above
+                raw_text = "\n".join(get_pdf_text(pdf_docs))
+                if not text_chunks:
+                    st.error("❌ No text could be extracted from the uploaded PDFs.")
+                    return
+                index_dir, stats = get_vector_store(text_chunks, docs_key, backend, st.session_state.get("index_dir"))
+                st.session_state["indexed_docs"] = (docs_key, backend)
+                st.session_state["index_backend"] = backend
+                st.session_state["index_dir"] = index_dir
+                st.session_state["raw_text"] = raw_text
+                st.success("✅ PDF Processing Complete! Ready to Answer Questions 🎉")
+                if stats["reused"]:
+                    st.caption("Reusing the existing index for these documents.")
+                else:
+                    caption = (
+                        f"{stats['chunks']} chunks indexed: {stats['added']} added, "
+                        f"{stats['removed']} removed, {stats['embedded']} newly embedded."
+                    )
+                    if stats["chunks_per_sec"]:
+                        caption += f" Embedding throughput: {stats['chunks_per_sec']:.1f} chunks/sec ({stats['retries']} retries)."
+                    st.caption(caption)
 
     # Answer user queries
     if user_question:
         st.subheader("💬 Your Question")
         st.write(f"**Q:** {user_question}")
         st.subheader("🤖 AI Response 👇")
-        answer = user_input(user_question)
-        st.write(answer)
+        if "index_dir" in st.session_state:
+            packing = {}
+            st.write_stream(user_input(user_question, st.session_state["index_dir"],
+                                       st.session_state["index_backend"], token_budget, packing))
+            if "cache" in packing:
+                cached = packing["cache"]
+                st.caption(
+                    f"⚡ Served from the answer cache in {cached['lookup_seconds'] * 1000:.0f} ms "
+                    f"(matched \"{cached['question']}\", similarity {cached['similarity']:.3f}; "
+                    f"the original answer took {cached['seconds']:.1f} s)."
+                )
+            elif packing:
+                st.caption(
+                    f"📦 Context: {packing['tokens']:,} / {packing['budget']:,} tokens from "
+                    f"{packing['packed']} of {packing['fetched']} candidate chunks "
+                    f"({packing['mmr_selected']} kept by MMR, {packing['duplicates']} duplicates dropped, "
+                    f"{packing['chars_trimmed']:,} overlapping characters trimmed)."
+                )
+        else:
+            st.write("Please upload PDF files before asking a question.")
 
         # User rating feature
         rating = st.slider("⭐ Rate the answer:", 1, 5, 3)
@@ -115,7 +219,7 @@ def main():
 
         # Download processed text
         st.subheader("📥 Download Extracted Text")
-        download_pdf(raw_text)
+        download_pdf(st.session_state.get("raw_text", ""))
 
     # Display question history
     if "query_history" not in st.session_state:
@@ -129,5 +233,14 @@ def main():
         for idx, question in enumerate(st.session_state.query_history):
             st.write(f"{idx+1}. {question}")
 
+    # Answer cache hit/miss statistics for this process
+    cache_stats = get_answer_cache().snapshot()
+    st.sidebar.markdown("### ⚡ Answer Cache")
+    st.sidebar.write(
+        f"Hits: {cache_stats['hits']} · Misses: {cache_stats['misses']} · "
+        f"Hit rate: {cache_stats['hit_rate']:.0%}"
+    )
+    st.sidebar.write(f"Time saved: {cache_stats['saved_seconds']:.1f} s · Entries: {cache_stats['entries']}")
+
 if __name__ == "__main__":
     main()
@@ -3,6 +3,7 @@ import tensorflow as tf
 import numpy as np
 from PIL import Image
 import time
+from metrics import track
 
 # ✅ Move set_page_config to the first line!
 st.set_page_config(page_title="Image Classifier", page_icon="📷", layout="centered")
@@ -26,7 +27,8 @@ def preprocess_image(image):
 # Function to get prediction
 def predict(image):
     processed_image = preprocess_image(image)
-    preds = model.predict(processed_image)
+    with track("image_classifier", "predict", processed_image.nbytes):
+        preds = model.predict(processed_image)
     decoded_preds = tf.keras.applications.mobilenet_v2.decode_predictions(preds, top=3)[0]
     return decoded_preds
 
@@ -0,0 +1,252 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+from PyPDF2 import PdfReader
+
+# Pages handed to a worker per task; batches with fewer pages than this are extracted inline
+PAGES_PER_TASK = 8
+MAX_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+# Address-space limit per worker process, and how many tasks a worker runs before it is recycled
+WORKER_MEMORY_MB = int(os.getenv("PDF_WORKER_MEMORY_MB", "1024"))
+WORKER_MAX_TASKS = 50
+# Total characters of extracted text kept in the per-process cache
+CACHE_MAX_CHARS = 50_000_000
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_cache = OrderedDict()
+_cache_chars = 0
+_cache_lock = threading.Lock()
+
+
+# Function to cap the memory of a worker process (no-op where unsupported)
+def _limit_worker_memory(limit_mb):
+    try:
+        import resource
+
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+# Function run inside a worker: extract one range of pages from a PDF on disk
+def _extract_range(path, start, stop):
+    reader = PdfReader(path)
+    texts = []
+    for index in range(start, stop):
+        try:
+            texts.append((index, reader.pages[index].extract_text() or ""))
+        except Exception:
+            # One unreadable page should not fail the whole document
+            texts.append((index, ""))
+    return texts
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_limit_worker_memory,
+                initargs=(WORKER_MEMORY_MB,),
+                max_tasks_per_child=WORKER_MAX_TASKS,
+            )
+        return _executor
+
+
+# Function to drop a pool whose worker died (e.g. past the memory limit), so the next
+# upload starts a fresh one instead of failing on the broken pool until a restart
+def _reset_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Function to submit a task, replacing the pool once if it broke while idle.
+# Returns (future, executor).
+def _submit(fn, *args):
+    executor = _get_executor()
+    try:
+        return executor.submit(fn, *args), executor
+    except BrokenProcessPool:
+        _reset_executor(executor)
+        executor = _get_executor()
+        return executor.submit(fn, *args), executor
+
+
+def _read_bytes(file):
+    if isinstance(file, bytes):
+        return file
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            return f.read()
+    if hasattr(file, "getvalue"):
+        return file.getvalue()
+    file.seek(0)
+    return file.read()
+
+
+# Function to compute the cache key of a PDF
+def file_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _cache_get(key):
+    with _cache_lock:
+        pages = _cache.get(key)
+        if pages is not None:
+            _cache.move_to_end(key)
+        return pages
+
+
+def _cache_put(key, pages):
+    global _cache_chars
+    size = sum(len(page) for page in pages)
+    if size > CACHE_MAX_CHARS:
+        return
+    with _cache_lock:
+        if key in _cache:
+            return
+        _cache[key] = pages
+        _cache_chars += size
+        while _cache_chars > CACHE_MAX_CHARS:
+            _, evicted = _cache.popitem(last=False)
+            _cache_chars -= sum(len(page) for page in evicted)
+
+
+# Function to work out, per file, its hash, page count and any cached pages
+def _prepare(files):
+    jobs = []
+    for file in files:
+        data = _read_bytes(file)
+        key = file_hash(data)
+        cached = _cache_get(key)
+        count = len(cached) if cached is not None else len(PdfReader(BytesIO(data)).pages)
+        jobs.append({"key": key, "data": data, "count": count, "cached": cached})
+    return jobs
+
+
+# Function to yield (file index, page index, text) for every page, in completion order.
+# Large documents are split into page ranges and fanned out over a process pool,
+# so pages of several files are extracted in parallel across cores.
+def _iter_pages(jobs):
+    futures = {}
+    temp_paths = []
+    results = {}
+    executors = {}
+    try:
+        inline = []
+        pending_pages = sum(job["count"] for job in jobs if job["cached"] is None)
+        for file_index, job in enumerate(jobs):
+            if job["cached"] is not None:
+                continue
+            results[file_index] = [None] * job["count"]
+            # Many small documents (e.g. a folder of resumes) still fan out, one task each
+            if pending_pages <= PAGES_PER_TASK or MAX_WORKERS <= 1:
+                inline.append(file_index)
+                continue
+            with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+                tmp.write(job["data"])
+            temp_paths.append(tmp.name)
+            for start in range(0, job["count"], PAGES_PER_TASK):
+                stop = min(start + PAGES_PER_TASK, job["count"])
+                future, executor = _submit(_extract_range, tmp.name, start, stop)
+                futures[future] = file_index
+                executors[future] = executor
+
+        for file_index, job in enumerate(jobs):
+            if job["cached"] is not None:
+                for page_index, text in enumerate(job["cached"]):
+                    yield file_index, page_index, text
+
+        for file_index in inline:
+            reader = PdfReader(BytesIO(jobs[file_index]["data"]))
+            for page_index, page in enumerate(reader.pages):
+                try:
+                    text = page.extract_text() or ""
+                except Exception:
+                    text = ""
+                results[file_index][page_index] = text
+                yield file_index, page_index, text
+            _cache_put(jobs[file_index]["key"], tuple(results[file_index]))
+
+        remaining = {}
+        for file_index in futures.values():
+            remaining[file_index] = remaining.get(file_index, 0) + 1
+        for future in as_completed(futures):
+            file_index = futures[future]
+            try:
+                texts = future.result()
+            except BrokenProcessPool:
+                _reset_executor(executors[future])
+                raise
+            for page_index, text in texts:
+                results[file_index][page_index] = text
+                yield file_index, page_index, text
+            remaining[file_index] -= 1
+            if remaining[file_index] == 0:
+                _cache_put(jobs[file_index]["key"], tuple(results[file_index]))
+    finally:
+        for future in futures:
+            future.cancel()
+        for path in temp_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# Function to yield page texts in document order, as soon as each page and all
+# pages before it are available, so downstream chunking can start early
+def iter_ordered_pages(files):
+    jobs = _prepare(files)
+    order = [(file_index, page_index) for file_index, job in enumerate(jobs) for page_index in range(job["count"])]
+    ready = {}
+    cursor = 0
+    for file_index, page_index, text in _iter_pages(jobs):
+        ready[(file_index, page_index)] = text
+        while cursor < len(order) and order[cursor] in ready:
+            yield ready.pop(order[cursor])
+            cursor += 1
+
+
+# Function to yield (file index, text, error) as each whole document finishes extracting.
+# A file that cannot be opened is reported with an error instead of failing the batch.
+def iter_documents(files):
+    jobs = []
+    indexes = []
+    for file_index, file in enumerate(files):
+        try:
+            jobs.extend(_prepare([file]))
+            indexes.append(file_index)
+        except Exception as error:
+            yield file_index, None, f"{type(error).__name__}: {error}"
+
+    pages = [[None] * job["count"] for job in jobs]
+    remaining = [job["count"] for job in jobs]
+    for position, count in enumerate(remaining):
+        if count == 0:
+            yield indexes[position], "", None
+    for position, page_index, text in _iter_pages(jobs):
+        pages[position][page_index] = text
+        remaining[position] -= 1
+        if remaining[position] == 0:
+            yield indexes[position], "\n".join(page for page in pages[position] if page), None
+
+
+# Function to extract the full text of one PDF
+def extract_text(file):
+    return "\n".join(text for text in iter_ordered_pages([file]) if text)
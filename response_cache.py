@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Persistent cache of model responses, bounded by size and age
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", "response_cache.db")
+MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MB", "256")) * 1024 * 1024
+TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+
+
+# Function to reduce request contents to something hashable: text stays as is,
+# image parts are replaced by the SHA-256 of their bytes
+def _canonical(contents):
+    if isinstance(contents, (list, tuple)):
+        return [_canonical(part) for part in contents]
+    if isinstance(contents, dict) and "data" in contents:
+        return {"mime_type": contents.get("mime_type"), "sha256": hashlib.sha256(contents["data"]).hexdigest()}
+    if isinstance(contents, (bytes, bytearray)):
+        return {"sha256": hashlib.sha256(contents).hexdigest()}
+    return contents
+
+
+# Function to build the cache key of a request from model, settings, prompt and attachments
+def request_key(model_name, contents, **settings):
+    payload = {"model": model_name, "settings": settings, "contents": _canonical(contents)}
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=RESPONSE_CACHE_PATH, max_bytes=MAX_BYTES, ttl=TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.stats["hits"] += 1
+            return row[0]
+
+    def put(self, key, model_name, response):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, 0)",
+                (key, model_name, response, size, now, now),
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _evict(self, now):
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until back under budget
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.stats["evictions"] += 1
+
+    def snapshot(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            total = self.stats["hits"] + self.stats["misses"]
+            return dict(self.stats, entries=entries, bytes=size,
+                        hit_rate=self.stats["hits"] / total if total else 0.0)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide response cache
+def get_response_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import zipfile
+from io import BytesIO
+
+from ats_scoring import score_resumes
+from gemini_client import StreamingJSONParser, generate_text, is_json_response
+from pdf_text import iter_documents
+
+MODEL_NAME = "gemini-1.5-flash"
+# Resumes analyzed at once in bulk mode; the shared Gemini gate still applies on top
+SCREENING_CONCURRENCY = int(os.getenv("ATS_CONCURRENCY", "8"))
+# Resumes sent to the model per batch; the rest keep only their local score until requested
+LLM_TOP_K = int(os.getenv("ATS_LLM_TOP_K", "20"))
+# Upper bound on the uncompressed PDFs read out of uploaded zip files
+MAX_ZIP_BYTES = int(os.getenv("ATS_MAX_ZIP_MB", "500")) * 1024 * 1024
+
+RESULT_COLUMNS = ["File", "Local Score", "Semantic", "JD Match", "Missing Keywords", "AI Missing Keywords",
+                  "Profile Summary", "Status"]
+
+
+# Function to build the ATS prompt asking the model for JSON only
+def build_prompt(resume_text, job_desc):
+    return f"""
+    You are an AI-powered ATS (Applicant Tracking System) specialized in resume screening.
+    Analyze the given resume against the job description and return **ONLY a valid JSON response**.
+
+    **Output Format (STRICTLY return only JSON, no extra text):**
+    {{
+        "JD Match": "75%",
+        "MissingKeywords": ["Python", "Machine Learning", "SQL"],
+        "Profile Summary": "The resume aligns well with the job description but lacks SQL and ML experience."
+    }}
+
+    **Resume:** {json.dumps(resume_text)}
+    **Job Description:** {json.dumps(job_desc)}
+
+    **Return ONLY a valid JSON (no extra words or explanations).**
+    """
+
+
+# Function to turn "75%" (or 75) into a number, or None when the model sent something else
+def match_percentage(value):
+    try:
+        return float(str(value).replace("%", "").strip())
+    except ValueError:
+        return None
+
+
+# Function to expand uploads into (name, PDF bytes) pairs, unpacking any zip files
+def collect_resumes(uploaded_files):
+    resumes = []
+    for uploaded in uploaded_files:
+        data = uploaded.getvalue()
+        if not uploaded.name.lower().endswith(".zip"):
+            resumes.append((uploaded.name, data))
+            continue
+        budget = MAX_ZIP_BYTES
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or not name.lower().endswith(".pdf") or name.startswith("__MACOSX/"):
+                    continue
+                budget -= info.file_size
+                if budget < 0:
+                    raise ValueError(f"{uploaded.name} holds more than {MAX_ZIP_BYTES // (1024 * 1024)} MB of PDFs.")
+                resumes.append((os.path.basename(name), archive.read(info)))
+    return resumes
+
+
+# Function to extract every resume, in parallel across processes.
+# Returns (texts, errors), both aligned with `resumes`.
+def extract_resumes(resumes, on_progress=None):
+    texts = [""] * len(resumes)
+    errors = [None] * len(resumes)
+    for done, (index, text, error) in enumerate(iter_documents([data for _, data in resumes]), start=1):
+        texts[index] = (text or "").strip()
+        errors[index] = error or (None if texts[index] else "No text could be extracted")
+        if on_progress:
+            on_progress(done, len(resumes))
+    return texts, errors
+
+
+# Function to score every resume locally, giving one result row per resume (same order)
+def prescreen(resumes, texts, errors, job_desc, embeddings=None):
+    rows = []
+    for (name, _), score, error in zip(resumes, score_resumes(texts, job_desc, embeddings), errors):
+        rows.append({
+            "File": name,
+            "Local Score": None if error else score["score"],
+            "Semantic": None if error else score["semantic"],
+            "JD Match": None,
+            "Missing Keywords": "" if error else ", ".join(score["missing"]),
+            "AI Missing Keywords": "",
+            "Profile Summary": "",
+            "Status": error or "not analyzed",
+        })
+    return rows
+
+
+# Function to pick the rows of the `k` best local scores that have not been analyzed yet
+def top_candidates(rows, k):
+    pending = [index for index, row in enumerate(rows) if row["Status"] == "not analyzed"]
+    return sorted(pending, key=lambda index: -rows[index]["Local Score"])[:k]
+
+
+# Function to run the model analysis for the chosen rows, at most `concurrency` at once.
+# Rows are updated in place; `on_result(index, done, total)` is called from the caller's
+# thread as each one finishes, so a UI can update while the batch runs.
+async def aanalyze_resumes(rows, texts, job_desc, indexes, concurrency=SCREENING_CONCURRENCY, on_result=None):
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+
+    async def analyze(index):
+        nonlocal done
+        row = rows[index]
+        async with semaphore:
+            try:
+                response = await asyncio.to_thread(
+                    generate_text, MODEL_NAME, build_prompt(texts[index], job_desc), page="ats", validate=is_json_response
+                )
+                parser = StreamingJSONParser()
+                parser.feed(response)
+                result = parser.result()
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+        if "error" in result:
+            row["Status"] = result["error"]
+        else:
+            row["JD Match"] = match_percentage(result.get("JD Match", ""))
+            row["AI Missing Keywords"] = ", ".join(result.get("MissingKeywords", []))
+            row["Profile Summary"] = result.get("Profile Summary", "")
+            row["Status"] = "ok"
+        done += 1
+        if on_result:
+            on_result(index, done, len(indexes))
+
+    await asyncio.gather(*(analyze(index) for index in indexes))
+    return rows
+
+
+# Function to run the model analysis from synchronous code such as a Streamlit script
+def analyze_resumes(rows, texts, job_desc, indexes, concurrency=SCREENING_CONCURRENCY, on_result=None):
+    return asyncio.run(aanalyze_resumes(rows, texts, job_desc, indexes, concurrency, on_result))
@@ -0,0 +1,109 @@
+import math
+import os
+
+from langchain_core.documents import Document
+
+# Token budget for the context stuffed into the prompt, and the MMR candidate pool. The pool
+# grows with the budget (see mmr_sizes); these are its floor for small budgets.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "4000"))
+FETCH_K = 40
+MMR_K = 12
+MMR_LAMBDA = 0.5
+# Candidates fetched per chunk MMR keeps, and the characters each indexed chunk is assumed
+# to add to the context once splitter overlap is trimmed
+FETCH_FACTOR = 3
+CHUNK_CHARS = 1800
+# Characters per token for budgeting; close enough for Gemini on English prose
+CHARS_PER_TOKEN = 4
+# Shortest shared span treated as splitter overlap rather than coincidence
+MIN_OVERLAP_CHARS = 32
+
+
+# Function to estimate the token count of a text
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+# Function to size the MMR selection so the chunks it keeps can fill the token budget
+def mmr_sizes(token_budget, chunk_chars=CHUNK_CHARS):
+    tokens_per_chunk = max(1, math.ceil(chunk_chars / CHARS_PER_TOKEN))
+    k = max(MMR_K, math.ceil(token_budget / tokens_per_chunk))
+    return max(FETCH_K, FETCH_FACTOR * k), k
+
+
+# Function to find how many leading characters of `text` repeat the end of `previous`
+def overlap_length(previous, text, max_overlap):
+    if len(text) < MIN_OVERLAP_CHARS:
+        return 0
+    probe = text[:MIN_OVERLAP_CHARS]
+    tail_start = max(0, len(previous) - max_overlap)
+    position = previous.find(probe, tail_start)
+    while position != -1:
+        if text.startswith(previous[position:]):
+            return len(previous) - position
+        position = previous.find(probe, position + 1)
+    return 0
+
+
+# Function to strip text that another selected chunk already carries (the splitter overlap)
+def trim_overlaps(texts, max_overlap):
+    trimmed = []
+    chars_removed = 0
+    for text in texts:
+        for previous in trimmed:
+            # `previous` ends with the start of `text`
+            head = overlap_length(previous, text, max_overlap)
+            if head:
+                text = text[head:]
+                chars_removed += head
+            # `text` ends with the start of `previous`
+            tail = overlap_length(text, previous, max_overlap)
+            if tail:
+                text = text[:-tail]
+                chars_removed += tail
+        trimmed.append(text)
+    return trimmed, chars_removed
+
+
+# Function to select the context for a question. Maximal marginal relevance picks diverse
+# chunks from the nearest candidates, overlapping spans are removed, and chunks are packed
+# most relevant first until the token budget is spent.
+def pack_context(vector_store, query_vector, token_budget=CONTEXT_TOKEN_BUDGET, max_overlap=1000,
+                 fetch_k=None, k=None, lambda_mult=MMR_LAMBDA, chunk_chars=CHUNK_CHARS):
+    default_fetch_k, default_k = mmr_sizes(token_budget, chunk_chars)
+    fetch_k = fetch_k or default_fetch_k
+    k = k or default_k
+    candidates = vector_store.max_marginal_relevance_search_with_score_by_vector(
+        query_vector, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult
+    )
+    # Lower L2 distance means more relevant
+    candidates.sort(key=lambda pair: pair[1])
+
+    seen = set()
+    unique = []
+    for doc, score in candidates:
+        if doc.page_content not in seen:
+            seen.add(doc.page_content)
+            unique.append((doc, score))
+
+    texts, chars_trimmed = trim_overlaps([doc.page_content for doc, _ in unique], max_overlap)
+
+    packed = []
+    tokens_used = 0
+    for (doc, _), text in zip(unique, texts):
+        tokens = estimate_tokens(text)
+        if not text.strip() or tokens_used + tokens > token_budget:
+            continue
+        packed.append(Document(page_content=text, metadata=doc.metadata))
+        tokens_used += tokens
+
+    stats = {
+        "budget": token_budget,
+        "tokens": tokens_used,
+        "fetched": min(fetch_k, vector_store.index.ntotal),
+        "mmr_selected": len(candidates),
+        "duplicates": len(candidates) - len(unique),
+        "packed": len(packed),
+        "chars_trimmed": chars_trimmed,
+    }
+    return packed, stats
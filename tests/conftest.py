@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_gemini_server import FakeConfig, start_server  # noqa: E402
+
+# A fast fake server: a short first-token delay, then many small chunks
+FAST = {"ttft_ms": 20, "latency_sigma": 0.0, "tokens_per_sec": 4000, "output_tokens": 60, "chunk_tokens": 4}
+
+# The client reads its endpoint, key and cache path at import, so they are set before any
+# test imports it. Caches and traces go to a scratch directory, never the app's own files.
+server, endpoint = start_server(FakeConfig(**FAST))
+os.environ["GEMINI_API_ENDPOINT"] = endpoint
+os.environ["GOOGLE_API_KEY"] = "fake-key"
+os.environ["RESPONSE_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="gemini-tests-"), "response_cache.db")
+os.environ["METRICS_TRACE_PATH"] = ""
+
+
+# Fixture giving each test a freshly configured fake server: set `.config`, read `.stats`
+@pytest.fixture
+def fake_server():
+    handler = server.RequestHandlerClass
+    handler.config = FakeConfig(**FAST)
+    with handler.stats_lock:
+        handler.stats["requests"] = 0
+    return handler
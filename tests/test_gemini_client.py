@@ -0,0 +1,133 @@
+import threading
+import uuid
+
+import pytest
+
+from fake_gemini_server import FakeConfig
+
+pytest.importorskip("google.generativeai")
+
+import gemini_client  # noqa: E402
+from gemini_client import (  # noqa: E402
+    RequestGate, StreamingJSONParser, coalescing_snapshot, flight_stats, generate_text, is_json_response, stream_content,
+)
+
+MODEL_NAME = "gemini-1.5-flash"
+
+
+# Prompts are made unique so one test never sees another's cached or in-flight response
+def unique_prompt(text):
+    return f"{text} ({uuid.uuid4().hex})"
+
+
+def test_stream_content_yields_chunks(fake_server):
+    chunks = list(stream_content(MODEL_NAME, unique_prompt("Summarize the report."), use_cache=False, page="test"))
+
+    assert len(chunks) > 1
+    assert all(chunks)
+    assert fake_server.stats["requests"] == 1
+
+
+def test_rate_limited_requests_are_retried(fake_server, monkeypatch):
+    fake_server.config = FakeConfig(ttft_ms=1, latency_sigma=0.0, fail_first=2, error_code=429)
+    monkeypatch.setattr(gemini_client, "backoff_delay", lambda attempt: 0)
+
+    text = generate_text(MODEL_NAME, unique_prompt("Summarize the report."), use_cache=False, page="test")
+
+    assert text
+    assert fake_server.stats["requests"] == 3
+
+
+def test_identical_requests_are_coalesced(fake_server):
+    fake_server.config = FakeConfig(ttft_ms=300, latency_sigma=0.0, tokens_per_sec=4000, output_tokens=60)
+    prompt = unique_prompt("Summarize the report.")
+    leaders, coalesced = flight_stats["leaders"], flight_stats["coalesced"]
+    results = [None, None]
+    barrier = threading.Barrier(2)
+
+    def ask(index):
+        barrier.wait()
+        results[index] = generate_text(MODEL_NAME, prompt, use_cache=False, page="test")
+
+    threads = [threading.Thread(target=ask, args=(index,)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert results[0] and results[0] == results[1]
+    assert fake_server.stats["requests"] == 1
+    assert flight_stats["leaders"] - leaders == 1
+    assert flight_stats["coalesced"] - coalesced == 1
+
+
+def test_waiters_are_released_when_they_stop_reading(fake_server):
+    fake_server.config = FakeConfig(ttft_ms=20, latency_sigma=0.0, tokens_per_sec=40, output_tokens=60, chunk_tokens=4)
+    prompt = unique_prompt("Summarize the report.")
+    leader = stream_content(MODEL_NAME, prompt, use_cache=False, page="test")
+    next(leader)
+
+    follower = stream_content(MODEL_NAME, prompt, use_cache=False, page="test")
+    next(follower)
+    assert coalescing_snapshot()["waiting"] == 1
+
+    follower.close()
+    assert coalescing_snapshot()["in_flight"] == 1
+    assert coalescing_snapshot()["waiting"] == 0
+    assert list(leader)
+
+
+def test_streamed_json_answer_is_parsed(fake_server):
+    prompt = unique_prompt('Act as an ATS. Response format: {"JD Match":"%","MissingKeywords":[],"Profile Summary":""}')
+    parser = StreamingJSONParser()
+
+    chunks = list(parser.consume(stream_content(MODEL_NAME, prompt, use_cache=False, page="test")))
+    result = parser.result()
+
+    assert len(chunks) > 1
+    assert result["JD Match"].endswith("%")
+    assert isinstance(result["MissingKeywords"], list)
+    assert result["Profile Summary"]
+
+
+def test_responses_failing_validation_are_not_cached(fake_server):
+    # Answered with plain words, not JSON
+    prompt = unique_prompt("Summarize the report.")
+
+    generate_text(MODEL_NAME, prompt, page="test", validate=is_json_response)
+    generate_text(MODEL_NAME, prompt, page="test", validate=is_json_response)
+    assert fake_server.stats["requests"] == 2
+
+    # Cached without a check, then evicted by the first caller that rejects it
+    generate_text(MODEL_NAME, prompt, page="test")
+    generate_text(MODEL_NAME, prompt, page="test", validate=is_json_response)
+    assert fake_server.stats["requests"] == 4
+
+
+def test_refresh_replaces_the_cached_response(fake_server):
+    prompt = unique_prompt('Response format: {"JD Match":"%","MissingKeywords":[],"Profile Summary":""}')
+
+    generate_text(MODEL_NAME, prompt, page="test", validate=is_json_response)
+    generate_text(MODEL_NAME, prompt, page="test", validate=is_json_response)
+    assert fake_server.stats["requests"] == 1
+
+    generate_text(MODEL_NAME, prompt, page="test", validate=is_json_response, refresh=True)
+    generate_text(MODEL_NAME, prompt, page="test", validate=is_json_response)
+    assert fake_server.stats["requests"] == 2
+
+
+def test_zero_rate_leaves_requests_unpaced():
+    gate = RequestGate(max_in_flight=2, rate_per_minute=0, burst=1)
+    admitted = 0
+
+    def admit():
+        nonlocal admitted
+        for _ in range(10):
+            with gate.slot():
+                admitted += 1
+
+    thread = threading.Thread(target=admit, daemon=True)
+    thread.start()
+    thread.join(timeout=5)
+
+    assert admitted == 10
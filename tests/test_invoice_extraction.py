@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("google.generativeai")
+
+from invoice_extraction import lookup_answer, parse_amount  # noqa: E402
+
+RECORD = {
+    "vendor": "Acme Supplies",
+    "invoice_number": "INV-1042",
+    "date": "2024-03-01",
+    "currency": "USD",
+    "subtotal": 100.0,
+    "tax": 18.0,
+    "total": 118.0,
+    "line_items": [{"description": "Widget", "quantity": 2, "unit_price": 50.0, "amount": 100.0}],
+    "other_fields": {"Due Date": "2024-03-31"},
+}
+
+
+@pytest.mark.parametrize("question, answer", [
+    ("Who is the vendor?", "**Vendor:** Acme Supplies"),
+    ("What is the invoice number?", "**Invoice number:** INV-1042"),
+    ("What is the total?", "**Total:** USD 118.00"),
+    ("What is the total tax?", "**Tax:** USD 18.00"),
+    ("List the items", "- 2 × Widget — USD 100.00"),
+    ("What is the Due Date?", "**Due Date:** 2024-03-31"),
+])
+def test_lookup_answers_questions_about_one_field(question, answer):
+    assert lookup_answer(question, RECORD) == answer
+
+
+@pytest.mark.parametrize("question", [
+    "What is the vendor address?",
+    "Who is the supplier contact?",
+    "What is the GST number?",
+    "Is there a tax exemption?",
+    "What is the total number of items?",
+    "What is the tax rate?",
+    "When is the total due?",
+    "Who is the buyer?",
+    "What are the vendor and the total?",
+])
+def test_lookup_leaves_other_questions_to_the_model(question):
+    assert lookup_answer(question, RECORD) is None
+
+
+@pytest.mark.parametrize("value, amount", [
+    ("1,234.50", 1234.5),
+    ("$ 99", 99.0),
+    ("12,50", 12.5),
+    ("1.234,50", 1234.5),
+    ("-5.00", -5.0),
+    ("(12.00)", -12.0),
+    ("$(1,234.50)", -1234.5),
+    ("USD (3.10)", -3.1),
+    (42, 42),
+    (None, None),
+    ("n/a", None),
+])
+def test_parse_amount(value, amount):
+    assert parse_amount(value) == amount
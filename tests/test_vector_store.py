@@ -0,0 +1,63 @@
+import gc
+
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("langchain_community")
+
+from langchain_core.embeddings import DeterministicFakeEmbedding  # noqa: E402
+
+import ann_index  # noqa: E402
+import vector_store  # noqa: E402
+from retrieval import pack_context  # noqa: E402
+
+DIMENSION = 64
+
+# Size thresholds (FLAT_MAX, HNSW_MAX) that make 400 chunks build each kind of index
+INDEX_KINDS = {
+    "flat": (10**6, 10**7),
+    "hnsw": (10, 10**7),
+    "ivfpq": (10, 100),
+}
+
+
+@pytest.fixture
+def embeddings(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "_cache", vector_store.EmbeddingCache(str(tmp_path / "embedding_cache.db")))
+    return DeterministicFakeEmbedding(size=DIMENSION)
+
+
+@pytest.mark.filterwarnings("ignore")
+@pytest.mark.parametrize("kind", list(INDEX_KINDS))
+def test_built_namespace_can_be_opened_and_searched(kind, embeddings, tmp_path, monkeypatch):
+    flat_max, hnsw_max = INDEX_KINDS[kind]
+    monkeypatch.setattr(ann_index, "FLAT_MAX", flat_max)
+    monkeypatch.setattr(ann_index, "HNSW_MAX", hnsw_max)
+    chunks = [f"chunk {i} about topic {i % 7} " * 20 for i in range(400)]
+
+    index_dir, _ = vector_store.build_namespace(kind, chunks, embeddings, root=str(tmp_path / "index"), model_name="fake")
+    store = vector_store.open_vector_store(index_dir, embeddings)
+    # The store must not depend on any temporary that the collector can free
+    gc.collect()
+
+    assert ann_index.index_kind(store.index) == kind
+    assert store.index.d == DIMENSION
+    assert store.index.ntotal == len(chunks)
+
+    docs, stats = pack_context(store, embeddings.embed_query("topic 3"))
+    assert docs
+    assert stats["packed"] == len(docs)
+
+
+@pytest.mark.filterwarnings("ignore")
+def test_large_budgets_select_enough_chunks_to_fill_them(embeddings, tmp_path):
+    chunks = [f"chunk {i} about topic {i % 7} " * 20 for i in range(400)]
+    index_dir, _ = vector_store.build_namespace("budget", chunks, embeddings, root=str(tmp_path / "index"), model_name="fake")
+    store = vector_store.open_vector_store(index_dir, embeddings)
+    chunk_chars = len(chunks[0])
+
+    small, _ = pack_context(store, embeddings.embed_query("topic 3"), 1000, chunk_chars=chunk_chars)
+    large, stats = pack_context(store, embeddings.embed_query("topic 3"), 16000, chunk_chars=chunk_chars)
+
+    assert len(large) > len(small)
+    assert stats["tokens"] > 16000 * 0.8
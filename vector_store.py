@@ -0,0 +1,431 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import faiss
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from ann_index import build_search_index, index_kind, tune_index
+from embedding_pipeline import embed_texts
+
+# Default location of the FAISS index and the persistent embedding cache
+INDEX_DIR = "faiss_index"
+EMBEDDING_CACHE_PATH = "embedding_cache.db"
+EMBEDDING_MODEL = "models/embedding-001"
+
+# On-disk layout of an index: raw faiss vectors plus a SQLite docstore (no pickles)
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.db"
+
+# Query-time stores kept open per process, and the flags used to memory-map the vectors
+# of Flat and HNSW indexes. IVF indexes are read normally: their inverted lists cannot be
+# memory-mapped this way, and their PQ codes are small anyway.
+STORE_CACHE_SIZE = 16
+MMAP_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+IVF_READ_FLAGS = faiss.IO_FLAG_READ_ONLY
+
+# Disk budget for per-document-set index namespaces, evicted least recently used first
+INDEX_BUDGET_BYTES = int(os.getenv("FAISS_INDEX_BUDGET_MB", "1024")) * 1024 * 1024
+# Namespaces used this recently are never evicted, so active readers keep their files
+EVICTION_GRACE_SECONDS = 300
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_BATCH = 500
+
+
+# Function to compute the content address of a text chunk
+def chunk_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# Persistent cache of chunk embeddings keyed by (model, chunk hash)
+class EmbeddingCache:
+    def __init__(self, path=EMBEDDING_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                chunk_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, chunk_hash)
+            )"""
+        )
+        self._conn.commit()
+
+    def get_many(self, model, hashes):
+        found = {}
+        hashes = list(hashes)
+        with self._lock:
+            for start in range(0, len(hashes), SQLITE_BATCH):
+                batch = hashes[start:start + SQLITE_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT chunk_hash, vector FROM embeddings WHERE model = ? AND chunk_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model, items):
+        rows = [(model, key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Function to get the process-wide embedding cache
+def get_embedding_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+# Function to embed chunks, calling the model only for chunks never seen before
+def embed_chunks(text_chunks, embeddings, model_name=EMBEDDING_MODEL, cache=None):
+    cache = cache or get_embedding_cache()
+    hashes = [chunk_hash(chunk) for chunk in text_chunks]
+    cached = cache.get_many(model_name, set(hashes))
+
+    missing = {}
+    for key, chunk in zip(hashes, text_chunks):
+        if key not in cached and key not in missing:
+            missing[key] = chunk
+
+    stats = {"embedded": len(missing), "chunks_per_sec": None, "retries": 0}
+    if missing:
+        vectors, pipeline_stats = embed_texts(list(missing.values()), embeddings)
+        fresh = list(zip(missing.keys(), vectors))
+        cache.put_many(model_name, fresh)
+        cached.update((key, np.asarray(vector, dtype=np.float32)) for key, vector in fresh)
+        stats["chunks_per_sec"] = pipeline_stats["chunks_per_sec"]
+        stats["retries"] = pipeline_stats["retries"]
+
+    return [cached[key] for key in hashes], stats
+
+
+# Read-only docstore backed by the SQLite file of an index, fetching rows on demand
+class SQLiteDocstore(Docstore):
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+    def search(self, search):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, metadata FROM documents WHERE position = ?", (int(search),)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def iter_documents(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT position, doc_id, text, metadata FROM documents ORDER BY position").fetchall()
+        for position, doc_id, text, metadata in rows:
+            yield position, doc_id, Document(page_content=text, metadata=json.loads(metadata))
+
+    def close(self):
+        self._conn.close()
+
+
+# Index position -> docstore key for a SQLiteDocstore, without loading every id into memory
+class _PositionIds(Mapping):
+    def __init__(self, size):
+        self._size = size
+
+    def __getitem__(self, position):
+        position = int(position)
+        if not 0 <= position < self._size:
+            raise KeyError(position)
+        return position
+
+    def __iter__(self):
+        return iter(range(self._size))
+
+    def __len__(self):
+        return self._size
+
+
+def _has_index(index_dir):
+    return os.path.exists(os.path.join(index_dir, INDEX_FILE)) and os.path.exists(os.path.join(index_dir, DOCSTORE_FILE))
+
+
+# Function to write an index as a faiss search index plus a SQLite docstore.
+# The working index is flat; the saved one is Flat, HNSW or IVF-PQ depending on corpus size.
+def save_index(vector_store, index_dir):
+    vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+    faiss.write_index(build_search_index(vectors), os.path.join(index_dir, INDEX_FILE))
+
+    path = os.path.join(index_dir, DOCSTORE_FILE)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute(
+            """CREATE TABLE documents (
+                position INTEGER PRIMARY KEY,
+                doc_id TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            )"""
+        )
+        rows = []
+        for position, doc_id in vector_store.index_to_docstore_id.items():
+            doc = vector_store.docstore.search(doc_id)
+            rows.append((position, doc_id, doc.page_content, json.dumps(doc.metadata)))
+        conn.executemany("INSERT INTO documents VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+
+# Function to load a saved index fully into memory for modification, returning None if there is none.
+# Approximate indexes cannot be edited, so their flat vectors are restored from the embedding cache.
+def load_vector_store(embeddings, index_dir=INDEX_DIR, model_name=EMBEDDING_MODEL):
+    if not _has_index(index_dir):
+        return None
+    index = faiss.read_index(os.path.join(index_dir, INDEX_FILE))
+    docstore = SQLiteDocstore(os.path.join(index_dir, DOCSTORE_FILE))
+    try:
+        documents = {}
+        index_to_docstore_id = {}
+        for position, doc_id, doc in docstore.iter_documents():
+            documents[doc_id] = doc
+            index_to_docstore_id[position] = doc_id
+    finally:
+        docstore.close()
+
+    if index_kind(index) != "flat":
+        texts = [documents[index_to_docstore_id[position]].page_content for position in range(len(index_to_docstore_id))]
+        vectors, _ = embed_chunks(texts, embeddings, model_name)
+        index = faiss.IndexFlatL2(index.d)
+        if vectors:
+            index.add(np.vstack(vectors))
+    return FAISS(embeddings, index, InMemoryDocstore(documents), index_to_docstore_id)
+
+
+# Function to get a version stamp that changes whenever an index is rewritten
+def index_version(index_dir):
+    return os.stat(os.path.join(index_dir, INDEX_FILE)).st_mtime_ns
+
+
+# Function to choose the read flags for a saved index from its type tag ("Iw.." for IVF)
+def read_flags(index_path):
+    with open(index_path, "rb") as f:
+        fourcc = f.read(4)
+    return IVF_READ_FLAGS if fourcc.startswith(b"Iw") else MMAP_FLAGS
+
+
+_store_cache = OrderedDict()
+_store_cache_lock = threading.Lock()
+
+
+# Function to open an index for querying. Stores are cached per process by path and
+# mtime, the vectors are memory-mapped and documents are read from SQLite on demand,
+# so a question neither unpickles nor copies the index and sessions share its pages.
+def open_vector_store(index_dir, embeddings):
+    index_path = os.path.join(index_dir, INDEX_FILE)
+    key = (os.path.abspath(index_dir), index_version(index_dir))
+    with _store_cache_lock:
+        vector_store = _store_cache.get(key)
+        if vector_store is not None:
+            _store_cache.move_to_end(key)
+            return vector_store
+
+    index = tune_index(faiss.read_index(index_path, read_flags(index_path)))
+    docstore = SQLiteDocstore(os.path.join(index_dir, DOCSTORE_FILE))
+    vector_store = FAISS(embeddings, index, docstore, _PositionIds(index.ntotal))
+
+    with _store_cache_lock:
+        vector_store = _store_cache.setdefault(key, vector_store)
+        while len(_store_cache) > STORE_CACHE_SIZE:
+            _store_cache.popitem(last=False)
+    return vector_store
+
+
+# Function to bring the index in line with the given chunks without rebuilding it.
+# Chunks are stored under their content hash, so unchanged chunks are kept as they
+# are, chunks that disappeared are removed and only new chunks are embedded and added.
+def update_vector_store(text_chunks, embeddings, index_dir=INDEX_DIR, model_name=EMBEDDING_MODEL):
+    chunks = {}
+    for chunk in text_chunks:
+        chunks.setdefault(chunk_hash(chunk), chunk)
+
+    try:
+        vector_store = load_vector_store(embeddings, index_dir, model_name)
+    except Exception:
+        # A corrupt or incompatible index is rebuilt from the embedding cache
+        vector_store = None
+
+    existing = set(vector_store.index_to_docstore_id.values()) if vector_store else set()
+    stale = [key for key in existing if key not in chunks]
+    new_ids = [key for key in chunks if key not in existing]
+
+    if stale:
+        vector_store.delete(stale)
+
+    stats = {"chunks": len(chunks), "added": len(new_ids), "removed": len(stale), "embedded": 0,
+             "chunks_per_sec": None, "retries": 0}
+    if new_ids:
+        new_texts = [chunks[key] for key in new_ids]
+        vectors, embed_stats = embed_chunks(new_texts, embeddings, model_name)
+        stats.update(embed_stats)
+        text_embeddings = list(zip(new_texts, vectors))
+        if vector_store is None:
+            vector_store = FAISS.from_embeddings(text_embeddings, embeddings, ids=new_ids)
+        else:
+            vector_store.add_embeddings(text_embeddings, ids=new_ids)
+
+    if vector_store is not None and (stale or new_ids):
+        save_index(vector_store, index_dir)
+
+    return vector_store, stats
+
+
+# Function to fingerprint a set of uploaded files by their bytes
+def documents_hash(files):
+    digest = hashlib.sha256()
+    for data in sorted(hashlib.sha256(f.getvalue()).digest() for f in files):
+        digest.update(data)
+    return digest.hexdigest()
+
+
+_namespace_locks = {}
+_namespace_locks_guard = threading.Lock()
+
+
+def _namespace_lock(docs_key):
+    with _namespace_locks_guard:
+        return _namespace_locks.setdefault(docs_key, threading.Lock())
+
+
+# Function to get the directory holding the index for one document set and embedding model
+def namespace_dir(docs_key, model_name=EMBEDDING_MODEL, root=INDEX_DIR):
+    model_tag = hashlib.sha256(model_name.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(root, f"{model_tag}-{docs_key}")
+
+
+# Function to record which embedding model built an index
+def write_index_meta(index_dir, model_name, dimension):
+    with open(os.path.join(index_dir, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({"embedding_model": model_name, "dimension": dimension}, f)
+
+
+# Function to read the metadata of an index, or None for indexes built before it existed
+def read_index_meta(index_dir):
+    try:
+        with open(os.path.join(index_dir, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# Function to refuse querying an index with a different embedding model than built it
+def check_index_model(index_dir, model_name):
+    meta = read_index_meta(index_dir)
+    if meta is None or meta["embedding_model"] != model_name:
+        built_with = meta["embedding_model"] if meta else "an unknown model"
+        raise ValueError(f"Index was built with {built_with}, not {model_name}.")
+
+
+# Function to mark a namespace as recently used for LRU eviction
+def touch_namespace(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+# Function to build (or reuse) the read-only index for a document set.
+# Sessions uploading identical documents share one namespace. A new namespace is
+# written into a temporary directory and renamed into place, so readers never see
+# a half-written index. When a base namespace is given (e.g. the previous upload
+# of the same session) it is copied first and only the changed chunks are applied.
+def build_namespace(docs_key, text_chunks, embeddings, base_dir=None, root=INDEX_DIR, model_name=EMBEDDING_MODEL):
+    final_dir = namespace_dir(docs_key, model_name, root)
+    with _namespace_lock(docs_key):
+        if _has_index(final_dir):
+            touch_namespace(final_dir)
+            return final_dir, {"chunks": None, "added": 0, "removed": 0, "embedded": 0, "reused": True}
+
+        os.makedirs(root, exist_ok=True)
+        tmp_dir = os.path.join(root, f".tmp-{docs_key}-{uuid.uuid4().hex}")
+        try:
+            base_meta = read_index_meta(base_dir) if base_dir else None
+            if base_meta and base_meta["embedding_model"] == model_name:
+                shutil.copytree(base_dir, tmp_dir)
+            else:
+                os.makedirs(tmp_dir)
+
+            vector_store, stats = update_vector_store(text_chunks, embeddings, index_dir=tmp_dir, model_name=model_name)
+            if vector_store is None:
+                raise ValueError("No text chunks to index.")
+            write_index_meta(tmp_dir, model_name, vector_store.index.d)
+            try:
+                os.rename(tmp_dir, final_dir)
+            except OSError:
+                # Another process published the same document set first; use theirs
+                if not _has_index(final_dir):
+                    raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    stats["reused"] = False
+    evict_namespaces(root, keep={final_dir})
+    return final_dir, stats
+
+
+def _dir_size(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+# Function to evict least recently used namespaces until the disk budget is met
+def evict_namespaces(root=INDEX_DIR, budget_bytes=INDEX_BUDGET_BYTES, keep=()):
+    if not os.path.isdir(root):
+        return []
+
+    namespaces = []
+    for entry in os.scandir(root):
+        if entry.is_dir() and not entry.name.startswith("."):
+            namespaces.append((entry.stat().st_mtime, entry.path, _dir_size(entry.path)))
+
+    total = sum(size for _, _, size in namespaces)
+    now = time.time()
+    evicted = []
+    for mtime, path, size in sorted(namespaces):
+        if total <= budget_bytes:
+            break
+        if path in keep or now - mtime < EVICTION_GRACE_SECONDS:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        evicted.append(path)
+    return evicted